@@ -2,7 +2,7 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
                            color_by, resample_by='5min',
                            gridlines=True):
 
-      # import numpy as np
+      import numpy as np
       # import pandas as pd
 
       import matplotlib.pyplot as plt
@@ -10,6 +10,12 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
       from . import plot_helpers as plothelp
       from .._munger import munger as munge
 
+      if row is None and col is None:
+          err1 = "Either `row` or `col` must be specified. "
+          err2 = "If you do not want to facet along the rows or columns, "
+          err3 = "supply one of the single-category variables (eg. Sex)."
+          raise ValueError(err1 + err2 + err3)
+
       # Handle the group_by and color_by keywords.
       munge.check_group_by_color_by(col, row, color_by, self.__feeds)
 
@@ -53,10 +59,7 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
       for column in ['Genotype','Temperature',
                      'Sex','FoodChoice']:
           try:
-              cats = np.sort(plotdf[column].unique())
-              plotdf.loc[:, column] = pd.Categorical(plotdf[column],
-                                                     categories=cats,
-                                                     ordered=True)
+              plotdf[column] = munge.sorted_categorical(plotdf[column])
           except KeyError:
               pass
 
@@ -72,15 +75,16 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
       # Compute means
       group_by_cols = [a for a in [col, row, color_by,'time_s']
                       if a is not None]
-      plotdf_groupby = plotdf.groupby(group_by_cols)
-      plotdf_mean = plotdf_groupby.mean().unstack()[yvar].T
+      plotdf_mean, plotdf_sem = munge.groupby_mean_sem(plotdf, group_by_cols,
+                                                       yvar)
+      plotdf_mean = plotdf_mean.unstack().T
 
-      # Compute CIs
-      plotdf_halfci = plotdf_groupby.sem().unstack()[yvar].T * 1.96
-      lower_ci = plotdf_mean - plotdf_halfci
-      upper_ci = plotdf_mean + plotdf_halfci
+      # Compute CIs, as arrays laid out like `plotdf_mean`.
+      mean_arr = plotdf_mean.to_numpy()
+      halfci_arr = plotdf_sem.unstack().T.to_numpy() * 1.96
       # Make sure no CI drops below zero.
-      lower_ci[lower_ci < 0] = 0
+      lower_arr = np.clip(mean_arr - halfci_arr, 0, None)
+      upper_arr = mean_arr + halfci_arr
 
       groupby_grps = plotdf[group_by].cat.categories.tolist()
       num_plots = int(len(groupby_grps))
@@ -106,18 +110,31 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
       else:
           axx = ax
 
+      # The time bins are shared by every facet.
+      x = plotdf_mean.index.to_numpy()
+      # Map each facet to its columns once, so the loops below only slice
+      # the arrays.
+      hue_names = plotdf_mean.columns.get_level_values(-1)
+      facet_cols = {}
+      for j, facet in enumerate(plotdf_mean.columns.droplevel(-1)):
+          facet_cols.setdefault(facet, []).append(j)
+
+      def plot_facet(plot_ax, facet):
+          # Plot the means as cumulative lines.
+          cols = facet_cols[facet]
+          lines = plot_ax.plot(x, mean_arr[:, cols], lw=1)
+          for line, label in zip(lines, hue_names[cols]):
+              line.set_label(label)
+          # Now, plot all the CIs as a single collection.
+          plothelp.fill_between_collection(plot_ax, x,
+                lower_arr[:, cols].T, upper_arr[:, cols].T,
+                colors=[l.get_color() for l in lines])
+
       if row is not None and col is not None:
            for r, row_ in enumerate(plotdf[row].cat.categories):
               for c, col_ in enumerate(plotdf[col].cat.categories):
                   plot_ax = axx[r, c] # the axes to plot on.
-                  # Plot the means as cumulative lines.
-                  plotdf_mean[(col_, row_)].plot(ax=plot_ax, lw=1)
-                  # Now, plot the CIs individually.
-                  for yvar_type in lower_ci[(col_, row_)].columns:
-                      plot_ax.fill_between(plotdf_mean.index,
-                                           lower_ci[(col_, row_, yvar_type)],
-                                           upper_ci[(col_, row_, yvar_type)],
-                                           alpha=0.25)
+                  plot_facet(plot_ax, (col_, row_))
                   plot_ax.set_title("{}; {}".format(row_, col_))
       else:
           # We only have one dimension here.
@@ -131,14 +148,7 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
                   plot_ax = axx[j]
               else:
                   plot_ax = axx
-              # Plot the means as cumulative lines.
-              plotdf_mean[(dim_)].plot(ax=plot_ax, lw=1)
-              # Now, plot the CIs individually.
-              for yvar_type in lower_ci[(dim_)].columns:
-                  plot_ax.fill_between(plotdf_mean.index,
-                                       lower_ci[(dim_, yvar_type)],
-                                       upper_ci[(dim_, yvar_type)],
-                                       alpha=0.25)
+              plot_facet(plot_ax, dim_)
               plot_ax.set_title(dim_)
 
       # Normalize all the y-axis limits.
@@ -149,20 +159,26 @@ def __cumulative_plotter(self, yvar, row, col, min_time, max_time,
       else:
           ax_arr = [axx]
 
+      # Set label for y-axis.
+      plt.setp(ax_arr, ylabel=yvar)
+
       for plot_ax in ax_arr:
           # Format x-axis.
           plt_helper.format_timecourse_xaxis(plot_ax,
                                              self.__expt_end_time)
-          # Set label for y-axis.
-          plot_ax.set_ylabel(yvar)
           # Plot vertical grid lines if desired.
           if gridlines:
               plot_ax.xaxis.grid(True, which='major',
                                  linestyle='dotted', #linewidth=1,
                                  alpha=0.5)
 
-          # Despine and offset each axis.
-          sns.despine(ax=plot_ax, trim=True, offset=3)
+      # Despine and offset all the axes in one go, unless we were handed
+      # axes that may share a figure with others.
+      if ax is None:
+          sns.despine(fig=fig, trim=True, offset=3)
+      else:
+          for plot_ax in ax_arr:
+              sns.despine(ax=plot_ax, trim=True, offset=3)
       if color_by is not None:
           legend_title = ' '
       else:
@@ -192,9 +192,13 @@ def add_time_column(df):
     """
     Convenience function to add a non DateTime column representing the time.
     """
+    import numpy as np
+
     temp = df.copy()
-    rt = temp.loc[:,'RelativeTime_s']
-    temp['time_s'] = rt.dt.hour*3600 + rt.dt.minute*60 + rt.dt.second
+    # Whole seconds since the start of the assay, kept as int64 so that
+    # grouping on this column uses the integer hashtable.
+    rt = temp['RelativeTime_s'].to_numpy(dtype='datetime64[s]')
+    temp['time_s'] = rt.astype(np.int64)
 
     return temp
 
@@ -264,7 +268,6 @@ def make_categorical_columns(df, added_labels=None):
     If there are added labels, this is also done.
     """
 
-    import numpy as np
     import pandas as pd
 
     # Assign Status based on genotype.
@@ -291,9 +294,7 @@ def make_categorical_columns(df, added_labels=None):
 
     for col in cols:
         try:
-            c = df[col]
-            df.loc[:, col] = pd.Categorical(c, categories=np.sort(c.unique()),
-                                            ordered=True)
+            df[col] = sorted_categorical(df[col])
         except KeyError:
             pass
 
@@ -303,18 +304,81 @@ def make_categorical_columns(df, added_labels=None):
 
 
 
+def sorted_levels(s):
+    """
+    Returns the sorted unique values of the Series `s`, ie. the categories
+    `sorted_categorical(s)` would have, without re-encoding `s`.
+
+    If `s` is a Categorical, its categories are sorted instead of scanning
+    the values.
+    """
+    import numpy as np
+    from pandas.api.types import CategoricalDtype
+
+    if isinstance(s.dtype, CategoricalDtype):
+        cats = s.cat.categories
+        if cats.is_monotonic_increasing:
+            return cats.to_numpy()
+        return np.sort(cats.to_numpy())
+
+    # Sort the unique values in place, rather than sorting a copy.
+    levels = s.unique()
+    if isinstance(levels, np.ndarray):
+        levels.sort()
+        return levels
+    return np.sort(levels)
+
+
+
+def sorted_categorical(s):
+    """
+    Returns the Series `s` as an ordered Categorical, with its sorted unique
+    values as the categories.
+
+    If `s` is already an ordered Categorical with sorted categories, it is
+    returned as is, so the values are not re-encoded. If it is an unsorted
+    Categorical, its categories are reordered, and only the codes are
+    remapped. Otherwise, the values are hashed once, by `factorize`.
+    """
+    from pandas import Categorical, Series, factorize
+    from pandas.api.types import CategoricalDtype
+
+    if isinstance(s.dtype, CategoricalDtype):
+        if s.cat.ordered and s.cat.categories.is_monotonic_increasing:
+            return s
+        return s.cat.reorder_categories(sorted_levels(s), ordered=True)
+
+    codes, uniques = factorize(s, sort=True)
+    return Series(Categorical.from_codes(codes, categories=uniques,
+                                         ordered=True),
+                  index=s.index, name=s.name)
+
+
+
 def check_column(col, df):
     """
     Convenience function to check if a dataframe has a column of interest.
     """
-    if not isinstance(col, str): # if col is not a string.
-        err = "{} is not a string.".format(col) + \
-              " Please enter a column name from `feeds` with quotation marks."
-        raise TypeError(errstr)
-    if col not in df.columns: # make sure col is a column in df.
-        err = "{} is not a column in the feedlog. Please check.".format(col)
+    check_columns([col], df)
+
+
+
+def check_columns(cols, df):
+    """
+    Convenience function to check if a dataframe has all the columns of
+    interest. The column names of `df` are only collected once.
+    """
+    for col in cols:
+        if not isinstance(col, str): # if col is not a string.
+            err = "{} is not a string.".format(col) + \
+                  " Please enter a column name from `feeds` with quotation marks."
+            raise TypeError(err)
+
+    present = set(df.columns)
+    missing = [col for col in cols if col not in present]
+    if len(missing) > 0: # make sure every col is a column in df.
+        err = "{} is not a column in the feedlog. Please check.".format(missing[0])
         raise KeyError(err)
-    pass
 
 
 
@@ -326,8 +390,7 @@ def check_group_by_color_by(col, row, color_by, df):
     not_none = [c for c in [col, row, color_by] if c is not None]
 
     if len(not_none) > 0:
-        for contrast in not_none:
-            check_column(contrast, df)
+        check_columns(not_none, df)
 
     # if col == color_by or row == color_by:
     #     if color_by is not None:
@@ -359,13 +422,17 @@ def groupby_resamp_sum(feeds, group_by_cols, resample_by='10min'):
     #             ]
 
 
-    # Convert RelativeTime_s to datetime if not done so already.
+    # Convert RelativeTime_s to datetime if not done so already. This is
+    # done on a new frame, so the caller's feeds are left untouched.
     if feeds.RelativeTime_s.dtype == 'float64':
-        feeds.loc[:,'RelativeTime_s'] = to_datetime(feeds['RelativeTime_s'],
-                                                    unit='s')
+        feeds = feeds.assign(RelativeTime_s=to_datetime(feeds['RelativeTime_s'],
+                                                        unit='s'))
 
     gbp_cols  = group_by_cols + ["ChamberID"]
-    df_groupby_resamp_sum = feeds.groupby(gbp_cols)\
+    # Only resample the group combinations actually present; with
+    # categorical grouping columns the default would expand to every
+    # combination of category levels.
+    df_groupby_resamp_sum = feeds.groupby(gbp_cols, observed=True)\
                                  .resample(resample_by, on='RelativeTime_s')\
                                  .sum()
     df_groupby_resamp_sum.reset_index(inplace=True)
@@ -375,6 +442,64 @@ def groupby_resamp_sum(feeds, group_by_cols, resample_by='10min'):
 
 
 
+def groupby_bin_sum(feeds, group_by_cols, bin_sec):
+    """
+    Sums a feedlog DataFrame in time bins of `bin_sec` seconds, for each
+    chamber in each group of `group_by_cols`.
+
+    This gives the same output as `groupby_resamp_sum` for a fixed frequency
+    that evenly divides a day: every chamber has a row for each bin from its
+    first to its last feed, and empty bins sum to zero. The bins are found
+    by integer division of `RelativeTime_s` (in seconds), and summed with
+    `numpy.bincount`, instead of resampling each chamber on a DatetimeIndex.
+    """
+    import numpy as np
+    from pandas import DataFrame, to_datetime
+
+    gbp_cols = group_by_cols + ["ChamberID"]
+    sum_cols = [c for c in feeds.columns
+                if c not in gbp_cols and c != 'RelativeTime_s']
+
+    key, codes, levels = factorize_groups(feeds, gbp_cols)
+    times = feeds.RelativeTime_s.to_numpy(dtype=float)
+
+    # Like resample, skip missing group labels and times.
+    valid = (key >= 0) & ~np.isnan(times)
+    if not valid.any():
+        return DataFrame(columns=[*gbp_cols, 'RelativeTime_s', *sum_cols])
+    bins = np.floor_divide(times[valid], bin_sec).astype(np.int64)
+
+    # Sort by chamber, then bin, to find the span of bins of each chamber.
+    order = np.lexsort((bins, key[valid]))
+    sorted_key = key[valid][order]
+    starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    first_bins = bins[order][starts]
+    n_bins = bins[order][ends] - first_bins + 1
+
+    # Each chamber gets a contiguous run of output rows, one per bin.
+    offsets = np.cumsum(n_bins) - n_bins
+    group_of_row = np.empty(len(order), dtype=np.int64)
+    group_of_row[order] = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    out_pos = offsets[group_of_row] + bins - first_bins[group_of_row]
+    n_out = n_bins.sum()
+
+    out = {}
+    first_rows = np.flatnonzero(valid)[order[starts]]
+    for col, col_codes, col_levels in zip(gbp_cols, codes, levels):
+        out[col] = col_levels.take(np.repeat(col_codes[first_rows], n_bins))
+    out_bins = np.arange(n_out) - np.repeat(offsets, n_bins) + \
+               np.repeat(first_bins, n_bins)
+    out['RelativeTime_s'] = to_datetime(out_bins * bin_sec, unit='s')
+    for col in sum_cols:
+        vals = feeds[col].to_numpy(dtype=float)[valid]
+        vals = np.where(np.isnan(vals), 0, vals) # sum skips NaNs.
+        out[col] = np.bincount(out_pos, weights=vals, minlength=n_out)
+
+    return DataFrame(out)
+
+
+
 def sum_for_timecourse(resamp_feeds):
     """
     Convenience function to sum a resampled feedlog for timecourse plotting.
@@ -411,7 +536,7 @@ def groupby_sum_for_timecourse(resampdf, row, col, color_by):
     group_by_cols = unique([a for a in [row, col, color_by, 'time_s']
                            if a is not None]
                            ).tolist()
-    out = resampdf.groupby(group_by_cols).sum()
+    out = resampdf.groupby(group_by_cols, observed=True).sum()
 
     # if row == col:
     #     reorder = [a for a in [row, color_by, 'time_s']
@@ -426,36 +551,102 @@ def groupby_sum_for_timecourse(resampdf, row, col, color_by):
 
 
 
+def factorize_groups(df, group_by_cols):
+    """
+    Encodes the groups in `group_by_cols` as a single integer key per row.
+
+    Returns the key, the integer codes of each column, and the sorted unique
+    values (levels) of each column. Rows with a missing group label have
+    a key of -1.
+    """
+    import numpy as np
+    from pandas import factorize
+
+    codes = []
+    levels = []
+    key = np.zeros(len(df), dtype=np.int64)
+    for col in group_by_cols:
+        col_codes, col_levels = factorize(df[col], sort=True)
+        codes.append(col_codes)
+        levels.append(col_levels)
+        key = key * len(col_levels) + col_codes
+
+    missing = np.zeros(len(df), dtype=bool)
+    for col_codes in codes:
+        missing |= col_codes < 0
+    key[missing] = -1
+
+    return key, codes, levels
+
+
+
+def grouped_cumsum(key, values):
+    """
+    Computes the cumulative sum of the rows of `values` within each group
+    of `key` (as returned by `factorize_groups`), in row order.
+
+    The rows are stably sorted by group (unless they already are, as in the
+    output of a groupby), summed with a single `numpy.cumsum`, and the
+    running total reached before each group is subtracted. Rows with a
+    missing group (key of -1) are NaN.
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    if len(key) == 0:
+        return values.copy()
+
+    presorted = bool(np.all(key[1:] >= key[:-1]))
+    if presorted:
+        sorted_key = key
+        cumsums = np.cumsum(values, axis=0)
+    else:
+        order = np.argsort(key, kind='stable')
+        sorted_key = key[order]
+        cumsums = np.cumsum(values[order], axis=0)
+
+    starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+    totals_before = np.concatenate([np.zeros((1,) + cumsums.shape[1:]),
+                                    cumsums[starts[1:] - 1]])
+    cumsums -= np.repeat(totals_before, np.diff(np.r_[starts, len(key)]),
+                         axis=0)
+
+    if presorted:
+        out = cumsums
+    else:
+        out = np.empty_like(cumsums)
+        out[order] = cumsums
+    out[key < 0] = np.nan
+
+    return out
+
+
+
 def cumsum_for_cumulative(df, group_by_cols):
     """
     Convenience function to sum a resampled feedlog for timecourse plotting.
     """
-    from pandas import merge
-
-    temp = df.copy()
+    from pandas import DataFrame
 
     # Rename for facility in plotting.
-    temp.rename(columns={'AverageFeedVolumePerFly_µl':'Cumulative Volume (µl)',
-                          'AverageFeedCountPerFly':'Cumulative Feed Count'},
-                inplace=True)
-
+    temp = df.rename(columns={'AverageFeedVolumePerFly_µl':'Cumulative Volume (µl)',
+                              'AverageFeedCountPerFly':'Cumulative Feed Count'})
 
     # Select only relevant columns.
-    cols_of_interest = ['RelativeTime_s', 'ChamberID',
-                        'Cumulative Feed Count',
-                        'Cumulative Volume (µl)'] + group_by_cols
+    cols_to_sum = ['Cumulative Feed Count', 'Cumulative Volume (µl)']
 
     # Carefully curate sets of columns for selection and GroupBy...
     group_by_cols_chamberID = group_by_cols+['ChamberID']
     group_by_cols_chamberID_RelativeTime = group_by_cols + ['RelativeTime_s', 'ChamberID']
 
     # Compute the cumulative sum, by Chamber.
-    grs_cumsum = temp[cols_of_interest].groupby(group_by_cols_chamberID).cumsum()
+    key, _, _ = factorize_groups(temp, group_by_cols_chamberID)
+    grs_cumsum = DataFrame(grouped_cumsum(key, temp[cols_to_sum]),
+                           index=temp.index, columns=cols_to_sum)
 
-    # Combine metadata with cumsum.
-    out = merge(grs_cumsum,
-                temp[group_by_cols_chamberID_RelativeTime],
-                left_index=True, right_index=True)
+    # Combine metadata with cumsum. Both share the index of `temp`, so
+    # this is aligned on the index instead of hash-merged.
+    out = grs_cumsum.join(temp[group_by_cols_chamberID_RelativeTime])
 
     # Add time column to facilitate plotting.
     out = add_time_column(out)
@@ -464,6 +655,94 @@ def cumsum_for_cumulative(df, group_by_cols):
 
 
 
+def groupby_mean_sem(df, group_by_cols, yvar, groups=None):
+    """
+    Computes the mean and the standard error of the mean of `yvar` for each
+    group in `group_by_cols`. If the output of `factorize_groups` for `df`
+    and `group_by_cols` is at hand, pass it as `groups` to reuse it.
+
+    This is equivalent to `df.groupby(group_by_cols)[yvar].mean()` (and
+    `.sem()`), but the groups are encoded as a single integer key and
+    reduced in vectorized passes over the data (one for the means, one for
+    the deviations from them): with `numpy.bincount` when there are few
+    possible keys, and otherwise by sorting once and reducing with
+    `numpy.add.reduceat`.
+
+    Returns two Series (mean, sem), indexed by the observed groups.
+    """
+    import numpy as np
+    from pandas import Index, MultiIndex, Series
+
+    if groups is None:
+        groups = factorize_groups(df, group_by_cols)
+    key, codes, levels = groups
+    yvals = df[yvar].to_numpy(dtype=float)
+
+    # Like pandas, skip missing group labels and missing values.
+    valid = ~np.isnan(yvals) & (key >= 0)
+    if not valid.all():
+        key = key[valid]
+        yvals = yvals[valid]
+        codes = [c[valid] for c in codes]
+
+    sizes = [len(l) for l in levels]
+    n_keys = 1
+    for size in sizes:
+        n_keys *= size
+
+    # The variance is summed from the deviations to the group means, in a
+    # second pass, rather than from the sums of squares; the cumulative
+    # sums are large compared to their spread, and the shortcut formula
+    # loses most of its precision to cancellation.
+    if len(key) == 0 or n_keys <= 2 * len(key) + 1024:
+        # Few possible keys: reduce with bincount, without sorting.
+        counts = np.bincount(key, minlength=n_keys)
+        sums = np.bincount(key, weights=yvals, minlength=n_keys)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dev = yvals - (sums / counts)[key]
+        sums_sq_dev = np.bincount(key, weights=dev * dev, minlength=n_keys)
+        group_keys = np.flatnonzero(counts)
+        counts = counts[group_keys]
+        sums = sums[group_keys]
+        sums_sq_dev = sums_sq_dev[group_keys]
+        # Unpack the group labels from the composite keys.
+        group_codes = []
+        for size in reversed(sizes):
+            group_keys, col_codes = np.divmod(group_keys, size)
+            group_codes.insert(0, col_codes)
+    else:
+        # Sort once (unless the rows already are), so that each group is a
+        # contiguous run of rows.
+        if not np.all(key[1:] >= key[:-1]):
+            order = np.argsort(key, kind='stable')
+            key = key[order]
+            yvals = yvals[order]
+            codes = [c[order] for c in codes]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        sums = np.add.reduceat(yvals, starts)
+        counts = np.diff(np.r_[starts, len(yvals)])
+        dev = yvals - np.repeat(sums / counts, counts)
+        sums_sq_dev = np.add.reduceat(dev * dev, starts)
+        # Rebuild the group labels from the first row of each group.
+        group_codes = [c[starts] for c in codes]
+
+    mean = sums / counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = sums_sq_dev / (counts - 1)
+    var = np.where(counts > 1, var, np.nan)
+    sem = np.sqrt(var / counts)
+
+    if len(group_by_cols) == 1:
+        index = Index(levels[0].take(group_codes[0]), name=group_by_cols[0])
+    else:
+        index = MultiIndex(levels=levels, codes=group_codes,
+                           names=group_by_cols)
+
+    return Series(mean, index=index, name=yvar), \
+           Series(sem, index=index, name=yvar)
+
+
+
 def assign_food_choice(chamberid, choiceid, mapper):
     """ Convenience function used to assign the food choice. """
     from numpy import nan
@@ -475,6 +754,22 @@ def assign_food_choice(chamberid, choiceid, mapper):
 
 
 
+def assign_food_choices(chamberids, choiceids, mapper):
+    """
+    Vectorized `assign_food_choice`: looks up the food choice of every
+    (ChamberID, ChoiceIdx) pair at once, from the Tube columns of `mapper`
+    (indexed by ChamberID). Pairs without a food choice get NaN.
+    """
+    from pandas import MultiIndex
+
+    choices = mapper.stack()
+    keys = MultiIndex.from_arrays([chamberids,
+                                   'Tube' + choiceids.astype(str)])
+
+    return choices.reindex(keys).to_numpy()
+
+
+
 def assign_status_from_genotype(genotype):
     """ Convenience function to map genotype to status."""
     if 'w1118' in genotype.lower():
@@ -579,10 +874,9 @@ def contrast_plot_munger(feeds, flies, added_labels, group_by, compare_by,
         gby = ["ChamberID", compare_by, color_by, *group_by]
         cat_cols = [compare_by, color_by, *group_by]
 
-    for c in cat_cols:
-        check_column(c, df)
+    check_columns(cat_cols, df)
 
-    if len(df[compare_by].unique()) < 2:
+    if df[compare_by].nunique(dropna=False) < 2:
         err = '{} has less than 2 categories'.format(compare_by) + \
               ' and cannot be used for `compare_by`.'
         raise ValueError(err)
@@ -618,24 +912,19 @@ def contrast_plot_munger(feeds, flies, added_labels, group_by, compare_by,
         padded.loc[:, c] = repeat(0, len(padded))
     df_in_window_padded = df_in_window.append(padded, ignore_index=True, sort=False)
 
-    # Groupby and sum.
-    grouped_sum = df_in_window_padded.groupby(gby).sum()
-    # Groupby and min for latency to first feed.
-    grouped_min = df_in_window_padded.dropna().groupby(gby).min()
-    for g in [grouped_sum, grouped_min]:
-        g.reset_index(inplace=True)
-        g.sort_values(gby, inplace=True)
-
-
-    grp_sum = grouped_sum[[*gby, "FeedDuration_ms",
-                           'AverageFeedVolumePerFly_µl',
-                           'AverageFeedCountPerFly',
-                           'AverageFeedSpeedPerFly_µl/s']].copy()
+    # Only aggregate the columns that are kept.
+    sum_cols = ["FeedDuration_ms", 'AverageFeedVolumePerFly_µl',
+                'AverageFeedCountPerFly', 'AverageFeedSpeedPerFly_µl/s']
 
-    grp_min = grouped_min[[*gby, "RelativeTime_s"]].copy()
-
-    grp_sum.set_index(gby, inplace=True)
-    grp_min.set_index(gby, inplace=True)
+    # Groupby and sum. The groupby output is already sorted by `gby`.
+    # Only the combinations of `gby` present in the feeds are kept; with
+    # categorical columns, the default would add a row for every
+    # combination of their categories.
+    grp_sum = df_in_window_padded.groupby(gby, observed=True)[sum_cols].sum()
+    # Groupby and min for latency to first feed.
+    grp_min = df_in_window_padded.dropna()\
+                                 .groupby(gby, observed=True)\
+                                 [["RelativeTime_s"]].min()
 
     plotdf = merge(left=grp_sum, right=grp_min, how='outer',
                    left_index=True, right_index=True).reset_index()
@@ -644,7 +933,8 @@ def contrast_plot_munger(feeds, flies, added_labels, group_by, compare_by,
         plotdf.set_index(["ChamberID", "FoodChoice"], inplace=True)
 
         # Figure out which chamber-food choice combi does not exist.
-        all_combis = df.groupby(['ChamberID', 'FoodChoice']).count().index
+        all_combis = df.groupby(['ChamberID', 'FoodChoice'],
+                                observed=True).count().index
 
         missing_combis = all_combis.difference(plotdf.index)
 
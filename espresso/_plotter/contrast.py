@@ -24,8 +24,39 @@ class contrast_plotter:
 
 
 
+    # The per-fly column produced by `munger.contrast_plot_munger` for each
+    # kind of contrast plot. Duration and latency are formatted with the
+    # abbreviation of the requested `time_unit`.
+    _YVARS = {'count'   : 'Total\nFeed Count\nPer Fly',
+              'volume'  : 'Total\nFeed Volume\nPer Fly (µl)',
+              'speed'   : 'Feed Speed\nPer Fly (nl/s)',
+              'duration': 'Total Time\nFeeding\nPer Fly ({})',
+              'latency' : 'Latency to\nFirst Feed ({})'}
+
+    # The SI prefix that each volume-based column is recorded in, and the
+    # label used when it is rescaled to a different `volume_unit`.
+    _VOLUME_UNITS = {'volume': ('micro', 'Total\nFeed Volume\nPer Fly ({}l)'),
+                     'speed' : ('nano', 'Feed Speed\nPer Fly ({}l/s)')}
+
+    _TIME_UNITS = {'duration': {'second': 'sec',
+                                'minute': 'min'},
+                   'latency' : {'second': 'sec',
+                                'minute': 'min',
+                                'hour'  : 'hr'}}
+
+    # The feed columns `munger.contrast_plot_munger` needs, on top of the
+    # user-selected group_by, compare_by and color_by columns.
+    _MUNGE_COLS = ['ChamberID', 'FoodChoice', 'Valid', 'ExperimentState',
+                   'RelativeTime_s', 'FeedDuration_ms',
+                   'AverageFeedVolumePerFly_µl', 'AverageFeedCountPerFly',
+                   'AverageFeedSpeedPerFly_µl/s']
+
+
+
     def __init__(self, plotter):
-        self.__feeds = plotter._experiment.feeds.copy()
+        # Keep a reference to the feeds; the munging functions never modify
+        # them in place, so there is no need for a defensive copy.
+        self.__feeds = plotter._experiment.feeds
         self.__flies = plotter._experiment.flies
         self.__expt_end_hour = plotter._experiment.expt_duration_minutes / 60
         try:
@@ -35,6 +66,73 @@ class contrast_plotter:
 
 
 
+    def __contrast_plotter(self, kind, group_by, compare_by, color_by,
+                           start_hour=0, end_hour=None, volume_unit=None,
+                           time_unit=None):
+        """
+        Munges the feeds for the contrast plot of `kind`, and returns the
+        corresponding dabest object.
+        """
+        from . import plot_helpers as plothelp
+
+        yvar = self._YVARS[kind]
+
+        if time_unit is not None:
+            time_dict = self._TIME_UNITS[kind]
+            if time_unit not in time_dict.keys():
+                raise ValueError("{} is not an accepted unit of time {}"\
+                                .format(time_unit, [a for a in time_dict.keys()])
+                                )
+            yvar = yvar.format(time_dict[time_unit])
+
+        start, end = plothelp.check_time_window(start_hour, end_hour,
+                                                self.__expt_end_hour)
+
+        feeds = self.__munge_feeds(group_by, compare_by, color_by)
+        plot_df = plothelp.prep_feeds_for_contrast_plot(feeds,
+                                                        self.__flies,
+                                                        self.__added_labels,
+                                                        group_by, compare_by,
+                                                        color_by, start, end)
+
+        if volume_unit is not None:
+            recorded_in, new_label = self._VOLUME_UNITS[kind]
+            if volume_unit.strip().split('lit')[0] != recorded_in:
+                multiplier = plothelp.get_unit_multiplier(volume_unit,
+                                                          convert_from=recorded_in)
+                new_unit = plothelp.get_new_prefix(volume_unit)
+                plot_col = yvar
+                yvar = new_label.format(new_unit)
+                plot_df[yvar] = plot_df[plot_col] * multiplier
+
+        return plothelp.dabest_parser(plot_df, yvar)
+
+
+
+    def __munge_feeds(self, group_by, compare_by, color_by):
+        """
+        Returns only the columns of the feeds needed for contrast munging, so
+        that the copies and groupbys downstream do not drag every other
+        column of the feedlog along.
+
+        Columns that are not in the feeds are skipped here; the munger will
+        raise an informative error for them.
+        """
+        if isinstance(group_by, (tuple, list)):
+            groups = [*group_by, compare_by, color_by]
+        else:
+            groups = [group_by, compare_by, color_by]
+
+        present = set(self.__feeds.columns)
+        cols = []
+        for c in [*self._MUNGE_COLS, *groups]:
+            if isinstance(c, str) and c in present and c not in cols:
+                cols.append(c)
+
+        return self.__feeds[cols]
+
+
+
     def feed_count_per_fly(self, group_by, compare_by, color_by='Genotype',
                            start_hour=0, end_hour=None):
 
@@ -75,35 +173,9 @@ class contrast_plotter:
         -------
         A dabest object for further plotting and analyses.
         """
-
-        from . import plot_helpers as plothelp
-
-        start, end = plothelp.check_time_window(start_hour, end_hour,
-                                                self.__expt_end_hour)
-
-        plot_df = plothelp.prep_feeds_for_contrast_plot(self.__feeds,
-                                                        self.__flies,
-                                                        self.__added_labels,
-                                                        group_by, compare_by,
-                                                        color_by, start, end)
-                                                        
-        
-
-        yvar = 'Total\nFeed Count\nPer Fly'
-        
-        return plothelp.dabest_parser(plot_df, yvar)
-        
-        # if 'float_contrast' not in kwargs.keys():
-        #     kwargs['float_contrast'] = False
-        # fig, stats =  plothelp.dabest_parser(plot_df, yvar, color_by, **kwargs)
-        # 
-        # title = '{} hr to {} hr'.format(start, end)
-        # fig.suptitle(title, fontsize=36)
-        # 
-        # if return_plot_data:
-        #     return fig, stats, plot_df
-        # else:
-        #     return fig, stats
+        return self.__contrast_plotter('count', group_by, compare_by, color_by,
+                                       start_hour=start_hour,
+                                       end_hour=end_hour)
 
 
 
@@ -144,41 +216,11 @@ class contrast_plotter:
         -------
         A dabest object for further plotting and analyses.
         """
+        return self.__contrast_plotter('volume', group_by, compare_by, color_by,
+                                       start_hour=start_hour,
+                                       end_hour=end_hour,
+                                       volume_unit=volume_unit)
 
-        from . import plot_helpers as plothelp
-
-        start, end = plothelp.check_time_window(start_hour, end_hour,
-                                             self.__expt_end_hour)
-
-        plot_df = plothelp.prep_feeds_for_contrast_plot(self.__feeds,
-                                                        self.__flies,
-                                                        self.__added_labels,
-                                                        group_by, compare_by,
-                                                        color_by, start, end)
-
-        plot_col = 'Total\nFeed Volume\nPer Fly (µl)'
-
-        if volume_unit.strip().split('lit')[0] == 'micro':
-            yvar = plot_col
-        else:
-            multiplier = plothelp.get_unit_multiplier(volume_unit,
-                                                      convert_from='micro')
-            new_unit = plothelp.get_new_prefix(volume_unit)
-            yvar = 'Total\nFeed Volume\nPer Fly ({}l)'.format(new_unit)
-            plot_df[yvar] = plot_df[plot_col] * multiplier
-            
-        return plothelp.dabest_parser(plot_df, yvar)
-
-        # kwargs['float_contrast'] = False # Fix this as False!
-        # fig, stats =  plothelp.dabest_parser(plot_df, yvar, color_by, **kwargs)
-        # 
-        # title = '{} hr to {} hr'.format(start, end)
-        # fig.suptitle(title, fontsize=36)
-        # 
-        # if return_plot_data:
-        #     return fig, stats, plot_df
-        # else:
-        #     return fig, stats
 
 
     def feed_speed_per_fly(self, group_by, compare_by, color_by='Genotype',
@@ -218,42 +260,10 @@ class contrast_plotter:
         -------
         A dabest object for further plotting and analyses.
         """
-
-        from . import plot_helpers as plothelp
-
-        start, end = plothelp.check_time_window(start_hour, end_hour,
-                                             self.__expt_end_hour)
-
-        plot_df = plothelp.prep_feeds_for_contrast_plot(self.__feeds,
-                                                        self.__flies,
-                                                        self.__added_labels,
-                                                        group_by, compare_by,
-                                                        color_by, start, end)
-
-        plot_col = 'Feed Speed\nPer Fly (nl/s)'
-
-        if volume_unit.strip().split('lit')[0] == 'nano':
-            yvar = plot_col
-        else:
-            multiplier = plothelp.get_unit_multiplier(volume_unit,
-                                                      convert_from='nano')
-            new_unit = plothelp.get_new_prefix(volume_unit)
-            yvar = 'Feed Speed\nPer Fly ({}l/s)'.format(new_unit)
-            plot_df[yvar] = plot_df[plot_col] * multiplier
-            
-        return plothelp.dabest_parser(plot_df, yvar)
-
-        # if 'float_contrast' not in kwargs.keys():
-        #     kwargs['float_contrast'] = False
-        # fig, stats =  plothelp.dabest_parser(plot_df, yvar, color_by, **kwargs)
-        # 
-        # title = '{} hr to {} hr'.format(start, end)
-        # fig.suptitle(title, fontsize=36)
-        # 
-        # if return_plot_data:
-        #     return fig, stats, plot_df
-        # else:
-        #     return fig, stats
+        return self.__contrast_plotter('speed', group_by, compare_by, color_by,
+                                       start_hour=start_hour,
+                                       end_hour=end_hour,
+                                       volume_unit=volume_unit)
 
 
 
@@ -293,37 +303,10 @@ class contrast_plotter:
         -------
         A dabest object for further plotting and analyses.
         """
-
-        from . import plot_helpers as plothelp
-
-        start, end = plothelp.check_time_window(start_hour, end_hour,
-                                             self.__expt_end_hour)
-        plot_df = plothelp.prep_feeds_for_contrast_plot(self.__feeds,
-                                                        self.__flies,
-                                                        self.__added_labels,
-                                                        group_by, compare_by,
-                                                        color_by, start, end)
-
-        time_dict = {'second': 'sec', 'minute': 'min'}
-        if time_unit not in time_dict.keys():
-            raise ValueError("{} is not an accepted unit of time {}"\
-                            .format(time_unit, [a for a in time_dict.keys()])
-                            )
-        yvar = 'Total Time\nFeeding\nPer Fly ({})'.format(time_dict[time_unit])
-        
-        return plothelp.dabest_parser(plot_df, yvar)
-        
-        # if 'float_contrast' not in kwargs.keys():
-        #     kwargs['float_contrast'] = False
-        # fig, stats =  plothelp.dabest_parser(plot_df, yvar, color_by, **kwargs)
-        # 
-        # title = '{} hr to {} hr'.format(start, end)
-        # fig.suptitle(title, fontsize=36)
-        # 
-        # if return_plot_data:
-        #     return fig, stats, plot_df
-        # else:
-        #     return fig, stats
+        return self.__contrast_plotter('duration', group_by, compare_by,
+                                       color_by, start_hour=start_hour,
+                                       end_hour=end_hour,
+                                       time_unit=time_unit)
 
 
 
@@ -362,38 +345,5 @@ class contrast_plotter:
         -------
         A dabest object for further plotting and analyses.
         """
-        from . import plot_helpers as plothelp
-        from .._munger import munger as munge
-
-        end_hr = self.__expt_end_hour
-        plot_df = plothelp.prep_feeds_for_contrast_plot(self.__feeds,
-                                                        self.__flies,
-                                                        self.__added_labels,
-                                                        group_by, compare_by,
-                                                        color_by, start_hour=0,
-                                                        end_hour=end_hr
-                                                        )
-
-        time_dict = {'second':  'sec',
-                     'minute':  'min',
-                     'hour'  :  'hr'}
-        if time_unit not in time_dict.keys():
-            raise ValueError("{} is not an accepted unit of time {}"\
-                            .format(time_unit, [a for a in time_dict.keys()])
-                            )
-        yvar = 'Latency to\nFirst Feed ({})'.format(time_dict[time_unit])
-        
-        return plothelp.dabest_parser(plot_df, yvar)
-        
-        
-        # if 'float_contrast' not in kwargs.keys():
-        #     kwargs['float_contrast'] = False
-        # fig, stats =  plothelp.dabest_parser(plot_df, yvar, color_by, **kwargs)
-        # 
-        # title = '{} hr to {} hr'.format(0, end_hr)
-        # fig.suptitle(title, fontsize=36)
-        # 
-        # if return_plot_data:
-        #     return fig, stats, plot_df
-        # else:
-        #     return fig, stats
+        return self.__contrast_plotter('latency', group_by, compare_by,
+                                       color_by, time_unit=time_unit)
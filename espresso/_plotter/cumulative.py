@@ -16,81 +16,225 @@ class cumulative_plotter:
 
 
     def __init__(self, plotter): # pass along an espresso_plotter instance.
-        self.__feeds = plotter._experiment.feeds.copy()
+        # Keep a reference to the feeds; the munging functions never modify
+        # them in place, so there is no need for a defensive copy.
+        self.__feeds = plotter._experiment.feeds
         self.__flies = plotter._experiment.flies
         self.__expt_end_time = plotter._experiment.expt_duration_minutes
+        # The (col, row, color_by) combinations already checked against the
+        # feeds.
+        self.__checked_facets = set()
+        # Cumulative sums and their encoded groups, keyed by the grouping
+        # columns, time bin and time window, so that `consumption` and
+        # `feed_count` can share the binning and grouping work.
+        self.__cumsum_cache = {}
+        # The mean and SEM of each cumulative column, under the same keys
+        # plus the column, so replotting with other aesthetics is cheap.
+        self.__stats_cache = {}
+        # The positions of the valid feeds in time order, and their sorted
+        # times, for slicing out a time window. Built on first use.
+        self.__time_order = None
+        # The last figure drawn with `reuse_figure`, with the key it was
+        # drawn for and its legend, so that it can be redrawn in place.
+        self.__last_figure = None
+        self.__experiment = plotter._experiment
+        self.__cached_feeds_version = getattr(self.__experiment,
+                                              '_feeds_version', 0)
         # try:
         #     self.__added_labels = plotter._experiment.added_labels
         # except AttributeError:
         #     self.__added_labels = [None]
 
 
+    def __getstate__(self):
+        # The cached cumulative sums and statistics can be as large as the
+        # resampled feeds for every plotted window, so they are not saved
+        # with the experiment (see `espresso.save`); like the time order of
+        # the feeds, they are rebuilt on demand. Open figures are not kept either.
+        state = self.__dict__.copy()
+        state['_cumulative_plotter__cumsum_cache'] = {}
+        state['_cumulative_plotter__stats_cache'] = {}
+        state['_cumulative_plotter__time_order'] = None
+        state['_cumulative_plotter__last_figure'] = None
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Plotters saved by older versions have none of the caches, nor the
+        # experiment; start them empty. The experiment is linked back by
+        # the espresso_plotter that holds this plotter.
+        defaults = {'checked_facets': set(), 'cumsum_cache': {},
+                    'stats_cache': {}, 'time_order': None,
+                    'last_figure': None, 'experiment': None,
+                    'cached_feeds_version': 0}
+        for name, default in defaults.items():
+            self.__dict__.setdefault('_cumulative_plotter__' + name, default)
+
+
+    def _link_experiment(self, experiment):
+        """
+        Links a plotter loaded without its experiment back to it.
+        """
+        if self.__experiment is None:
+            self.__experiment = experiment
+
+
     def __cumulative_plotter(self, yvar, row, col, time_col,
                              start_hour, end_hour,  ylim, color_by,
                              volume_unit=None, font_scale=1.5,
                              height=10, width=10, palette=None,
                              return_plot_data=False,
-                             timebin='5min', gridlines=True):
+                             timebin='5min', gridlines=True,
+                             reuse_figure=False, verbose=False):
 
         import sys
+        import warnings
+        import numpy as np
         import matplotlib.pyplot as plt
-        from pandas import concat, merge
+        from pandas import concat, to_timedelta, DataFrame
         import seaborn as sns
         from . import plot_helpers as plothelp
         from .._munger import munger as munge
 
-        import warnings
-        warnings.filterwarnings("ignore", category=FutureWarning) # from scipy
-        warnings.filterwarnings("ignore", category=UserWarning) # from matplotlib
-
-        if row is None and col is None:
-            err1 = "Either `row` or `col` must be specified. "
-            err2 = "If you do not want to facet along the rows or columns, "
-            err3 = "supply one of the single-category variables (eg. Sex)."
-            raise ValueError(err1 + err2 + err3)
+        # Progress is only reported when asked for, since each write to the
+        # terminal flushes.
+        if verbose:
+            progress = sys.stdout.write
+        else:
+            progress = lambda msg: None
+
+        progress('Munging')
+        # Drop the cached results if the feeds have changed since.
+        feeds_version = getattr(self.__experiment, '_feeds_version', 0)
+        if feeds_version != self.__cached_feeds_version:
+            self.__checked_facets.clear()
+            self.__cumsum_cache.clear()
+            self.__stats_cache.clear()
+            self.__time_order = None
+            self.__last_figure = None
+            self.__cached_feeds_version = feeds_version
 
-        sys.stdout.write('Munging')
         # Handle the group_by and color_by keywords.
-        munge.check_group_by_color_by(col, row, color_by, self.__feeds)
-        sys.stdout.write('.')
+        if (col, row, color_by) not in self.__checked_facets:
+            munge.check_group_by_color_by(col, row, color_by, self.__feeds)
+            self.__checked_facets.add((col, row, color_by))
+        progress('.')
 
         gbp_cols = [c for c in [col, row, color_by] if c is not None]
 
-        # Select only valid feeds.
-        all_pads = self.__feeds[self.__feeds.ExperimentState == "PAD"].copy()
-        real_feeds = self.__feeds[self.__feeds.Valid].copy()
-        for_cumplot = concat([all_pads, real_feeds])
-        
-        # Resample (aka bin by time).
-        resamp_feeds = munge.groupby_resamp_sum(for_cumplot, gbp_cols, timebin)
-        sys.stdout.write('.')
-
         # Convert hour input to seconds.
         min_time_sec = start_hour * 3600
         max_time_sec = end_hour * 3600
-        # Filter the cumsum dataframe for the desired time window.
-        resamp_feeds = munge.add_time_column(resamp_feeds)
-        resamp_feeds_win = resamp_feeds[
-                        (resamp_feeds.time_s >= min_time_sec) &
-                        (resamp_feeds.time_s <= max_time_sec)]
-        sys.stdout.write('.')
 
-
-        # Perform cumulative summation.
-        plotdf = munge.cumsum_for_cumulative(resamp_feeds_win, gbp_cols)
-        sys.stdout.write('.')
-
-        if volume_unit is not None:
-            if volume_unit.strip().split('lit')[0] == 'micro':
-                y = yvar
+        # Resample (aka bin by time), and sum cumulatively. This does not
+        # depend on `yvar`, so it is reused across calls, along with the
+        # groups the mean and CIs are computed over.
+        stat_cols = [*dict.fromkeys(gbp_cols), time_col]
+        cache_key = (tuple(gbp_cols), time_col, timebin,
+                     min_time_sec, max_time_sec)
+        try:
+            plotdf, stat_groups = self.__cumsum_cache[cache_key]
+        except KeyError:
+            # Only the grouping columns, the time, and the columns summed
+            # for the plot are carried through the resampling.
+            cols = [*dict.fromkeys([*gbp_cols, 'ChamberID']), 'RelativeTime_s',
+                    'AverageFeedVolumePerFly_µl', 'AverageFeedCountPerFly']
+
+            # Select only valid feeds.
+            all_pads = self.__feeds.loc[self.__feeds.ExperimentState == "PAD",
+                                        cols]
+            real_feeds = self.__feeds[self.__feeds.Valid]
+
+            # Only resample the feeds in the time bins that start within
+            # the window. The bins are aligned to midnight, so this is exact
+            # when the bin evenly divides a day. The pad rows (which hold no
+            # feeds) are moved into the window, so that every chamber still
+            # spans all of it.
+            try:
+                bin_sec = to_timedelta(timebin).total_seconds()
+            except ValueError: # not a fixed frequency.
+                bin_sec = None
+            fixed_bins = bool(bin_sec) and 86400 % bin_sec == 0
+            prefiltered = False
+            if fixed_bins:
+                first_bin = np.ceil(min_time_sec / bin_sec) * bin_sec
+                last_bin = np.floor(max_time_sec / bin_sec) * bin_sec
+                if first_bin <= last_bin:
+                    # Slice the window out of the valid feeds in time
+                    # order. Only the order is kept, not a sorted copy.
+                    if self.__time_order is None:
+                        times = real_feeds.RelativeTime_s.to_numpy()
+                        order = np.argsort(times, kind='mergesort')
+                        self.__time_order = order, times[order]
+                    order, sorted_times = self.__time_order
+                    lo, hi = sorted_times.searchsorted([first_bin,
+                                                        last_bin + bin_sec])
+                    real_feeds = real_feeds.iloc[order[lo:hi]]
+                    all_pads = all_pads.assign(RelativeTime_s=\
+                        all_pads.RelativeTime_s.clip(first_bin, last_bin))
+                    prefiltered = True
+
+            for_cumplot = concat([all_pads, real_feeds[cols]])
+            # Group on integer codes rather than strings: encode the string
+            # grouping columns (eg. ChamberID) once, and every groupby and
+            # factorization after this reuses the codes. The categories are
+            # sorted, so the groups come out in the same order.
+            for c in cols[:-2]:
+                if for_cumplot[c].dtype == object:
+                    for_cumplot[c] = for_cumplot[c].astype('category')
+
+            if fixed_bins:
+                # The bins are whole multiples of `bin_sec`, so they can be
+                # found by integer division rather than by resampling.
+                resamp_feeds = munge.groupby_bin_sum(for_cumplot, gbp_cols,
+                                                     bin_sec)
             else:
+                resamp_feeds = munge.groupby_resamp_sum(for_cumplot, gbp_cols,
+                                                        timebin)
+            resamp_feeds = munge.add_time_column(resamp_feeds)
+
+            if not prefiltered:
+                # Drop the bins outside the window instead.
+                resamp_feeds = resamp_feeds[
+                                (resamp_feeds.time_s >= min_time_sec) &
+                                (resamp_feeds.time_s <= max_time_sec)]
+
+            # Perform cumulative summation.
+            plotdf = munge.cumsum_for_cumulative(resamp_feeds, gbp_cols)
+            stat_groups = munge.factorize_groups(plotdf, stat_cols)
+            self.__cumsum_cache[cache_key] = plotdf, stat_groups
+            # Free the intermediate frames now, rather than holding them
+            # while plotting.
+            del all_pads, real_feeds, for_cumplot, resamp_feeds
+        progress('...')
+
+        y = yvar
+        multiplier = 1
+        if volume_unit is not None:
+            if volume_unit.strip().split('lit')[0] != 'micro':
                 multiplier = plothelp.get_unit_multiplier(volume_unit,
                                                           convert_from='micro')
                 new_unit = plothelp.get_new_prefix(volume_unit)
                 y = 'Cumulative Volume ({}l)'.format(new_unit)
-                plotdf[y] = plotdf[yvar] * multiplier
-        else:
-            y = yvar
+
+        # Compute the mean and 95% CI across chambers for each group and
+        # time bin once, rather than bootstrapping them for every facet.
+        # Both scale linearly, so the unit conversion is applied to them
+        # rather than to every row.
+        try:
+            mean, sem = self.__stats_cache[cache_key + (yvar,)]
+        except KeyError:
+            mean, sem = munge.groupby_mean_sem(plotdf, stat_cols, yvar,
+                                               groups=stat_groups)
+            self.__stats_cache[cache_key + (yvar,)] = mean, sem
+        if multiplier != 1:
+            mean = mean * multiplier
+            sem = sem * multiplier
+        halfci = 1.96 * sem.fillna(0)
+        plot_stats = DataFrame({y: mean,
+                                'ci_lower': (mean - halfci).clip(lower=0),
+                                'ci_upper': mean + halfci}).reset_index()
 
         # Parse keywords.
         if palette is None:
@@ -105,58 +249,180 @@ class cumulative_plotter:
         #                 (plotdf.time_s <= max_time_sec)]
         # sys.stdout.write('.')
 
-        # initialise FacetGrid.
-        sys.stdout.write('\nPlotting')
-        sns.set(style='ticks', context='poster')
-
-        g = sns.FacetGrid(plotdf, row=row, col=col,
-                          hue=color_by, legend_out=True,
-                          palette=palette,
-                          xlim=(min_time_sec, max_time_sec),
-                          sharex=False, sharey=True,
-                          height=height, aspect=width/height,
-                          gridspec_kws={'hspace':0.3, 'wspace':0.3}
-                          )
-
-        sys.stdout.write('.') # This seems to be the limiting factor.
-        g.map(sns.lineplot, time_col, y, ci=95)
-
-        if row is None:
-            g.set_titles("{col_var} = {col_name}")
-        elif col is None:
-            g.set_titles("{row_var} = {row_name}")
-        elif row is not None and col is not None:
-            g.set_titles("{row_var} = {row_name}\n{col_var} = {col_name}")
-
-        g.add_legend()
-        sys.stdout.write('.')
-
-        # Aesthetic tweaks.
-        for j, ax in enumerate(g.axes.flat):
-
-            plothelp.format_timecourse_xaxis(ax, min_time_sec, max_time_sec)
-            ax.tick_params(which='major', length=12, pad=12)
-            ax.tick_params(which='minor', length=6)
-            ax.set_ylabel(ax.get_ylabel())
-
-            ax.set_ylim(0, ax.get_ylim()[1])
-            ax.yaxis.set_tick_params(labelleft=True)
-
-            if gridlines:
-                ax.xaxis.grid(True, which='major',
-                              linestyle='dotted',
-                              alpha=0.75)
-        sys.stdout.write('.')
-
-        sns.despine(fig=g.fig, offset={'left':5, 'bottom': 5})
-        sns.set() # reset style.
-        sys.stdout.write('.')
-
-        # End and return the FacetGrid.
+        # Silence the warnings raised while plotting, without leaving the
+        # filters installed after we return.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=FutureWarning) # from scipy
+            warnings.simplefilter("ignore", category=UserWarning) # from matplotlib
+
+            progress('\nPlotting')
+            sns.set(style='ticks', context='poster')
+
+            # The facets and their levels are the same for the same groups
+            # and time window, so the last figure can be cleared and redrawn
+            # instead of building a new one.
+            figure_key = cache_key + (row, col, color_by, height, width)
+            last = self.__last_figure
+            reused = reuse_figure and last is not None \
+                     and last[0] == figure_key \
+                     and plt.fignum_exists(last[2].number)
+            if reused:
+                # The layout and the figure legend are kept as they are.
+                _, g, fig, axes, fig_legend = last
+                for ax in axes.flat:
+                    ax.cla()
+            elif row is None and col is None:
+                # A single panel needs none of the FacetGrid bookkeeping.
+                g, fig_legend = None, None
+                fig, ax = plt.subplots(figsize=(width, height))
+                ax.set_xlim(min_time_sec, max_time_sec)
+                axes = np.array([[ax]])
+            else:
+                # initialise FacetGrid.
+                g = sns.FacetGrid(plot_stats, row=row, col=col,
+                                  hue=color_by, legend_out=True,
+                                  palette=palette,
+                                  xlim=(min_time_sec, max_time_sec),
+                                  sharex=False, sharey=True,
+                                  height=height, aspect=width/height,
+                                  gridspec_kws={'hspace':0.3, 'wspace':0.3}
+                                  )
+                fig, axes = g.fig, g.axes
+                fig_legend = None
+
+            progress('.')
+            # Draw each facet and hue level from its own rows. These are
+            # found with one groupby, instead of FacetGrid.map masking the
+            # whole table for every facet and hue level.
+            facet_vars = [row, col, color_by]
+            grouper = [plot_stats[v] for v in facet_vars if v is not None]
+            if grouper:
+                groups = plot_stats.groupby(grouper, observed=True, sort=False)
+                groups = {k if isinstance(k, tuple) else (k,): idx
+                          for k, idx in groups.indices.items()}
+            else:
+                groups = {(): np.arange(len(plot_stats))}
+            # Only the arrays handed to matplotlib are downcast; the cached
+            # sums and the returned plot data keep their full precision.
+            # The times are whole seconds within the assay.
+            t = plot_stats[time_col].to_numpy(dtype=np.int32)
+            mean_, lower, upper = [plot_stats[c].to_numpy(dtype=np.float32)
+                                   for c in [y, 'ci_lower', 'ci_upper']]
+
+            row_names = [None] if row is None else g.row_names
+            col_names = [None] if col is None else g.col_names
+            if color_by is None:
+                hue_names = [None]
+            elif g is None:
+                hue_names = list(plot_stats[color_by].drop_duplicates()
+                                                     .sort_values())
+            else:
+                hue_names = g.hue_names
+            colors = sns.color_palette(palette, len(hue_names))
+
+            legend_data = {}
+            for i, row_name in enumerate(row_names):
+                for j, col_name in enumerate(col_names):
+                    ax = axes[i, j]
+                    bands = [], [], [], [] # x, lower, upper, color
+                    for k, hue_name in enumerate(hue_names):
+                        names = [row_name, col_name, hue_name]
+                        key = tuple(n for v, n in zip(facet_vars, names)
+                                    if v is not None)
+                        try:
+                            idx = groups[key]
+                        except KeyError: # no chambers in this group.
+                            continue
+                        label = None if hue_name is None else str(hue_name)
+                        line, = ax.plot(t[idx], mean_[idx], color=colors[k],
+                                        label=label)
+                        if label is not None:
+                            legend_data[label] = line
+                        for band, v in zip(bands, [t[idx], lower[idx],
+                                                   upper[idx], colors[k]]):
+                            band.append(v)
+                    # Shade all the CIs in this facet as one collection.
+                    if bands[0]:
+                        band_x, band_lower, band_upper, band_colors = bands
+                        plothelp.fill_between_collection(ax, band_x,
+                                                         band_lower, band_upper,
+                                                         colors=band_colors)
+
+            if g is None:
+                ax.set_xlabel(time_col)
+                ax.set_ylabel(y)
+                if legend_data:
+                    ax.legend(legend_data.values(), legend_data.keys(),
+                              title=color_by, frameon=False,
+                              loc='upper left', bbox_to_anchor=(1, 1))
+                fig.tight_layout()
+            else:
+                g.set_axis_labels(time_col, y)
+                if not reused:
+                    g.fig.tight_layout()
+
+                if row is None:
+                    g.set_titles("{col_var} = {col_name}")
+                elif col is None:
+                    g.set_titles("{row_var} = {row_name}")
+                elif row is not None and col is not None:
+                    g.set_titles("{row_var} = {row_name}\n{col_var} = {col_name}")
+
+                if not reused:
+                    g.add_legend(legend_data=legend_data)
+                    # FacetGrid draws its legend on the figure.
+                    fig_legend = fig.legends[-1] if fig.legends else None
+                elif fig_legend is not None:
+                    # The figure was drawn for the same groups, so it has the
+                    # same hue levels. Update the colors of the legend drawn
+                    # before, since adding another would resize the figure.
+                    for entry, text, (label, line) in zip(
+                                                fig_legend.get_lines(),
+                                                fig_legend.get_texts(),
+                                                legend_data.items()):
+                        entry.set_color(line.get_color())
+                        text.set_text(label)
+            # Only keep hold of the figure when it may be reused, so that
+            # figures drawn without `reuse_figure` are freed once closed.
+            if reuse_figure:
+                self.__last_figure = figure_key, g, fig, axes, fig_legend
+            else:
+                self.__last_figure = None
+            progress('.')
+
+            # Aesthetic tweaks.
+            major_ticks = plothelp.timecourse_major_ticks(min_time_sec,
+                                                          max_time_sec)
+            for j, ax in enumerate(axes.flat):
+
+                plothelp.format_timecourse_xaxis(ax, min_time_sec, max_time_sec,
+                                                 major_ticks=major_ticks)
+                ax.tick_params(which='major', length=12, pad=12)
+                ax.tick_params(which='minor', length=6)
+                ax.set_ylabel(ax.get_ylabel())
+
+                ax.set_ylim(0, ax.get_ylim()[1])
+                ax.yaxis.set_tick_params(labelleft=True)
+
+                if gridlines:
+                    ax.xaxis.grid(True, which='major',
+                                  linestyle='dotted',
+                                  alpha=0.75)
+            progress('.')
+
+            sns.despine(fig=fig, offset={'left':5, 'bottom': 5})
+            sns.set() # reset style.
+            progress('.')
+
+        # End and return the FacetGrid, or the Figure for a single panel.
+        out = fig if g is None else g
         if return_plot_data:
-            return g, plotdf
+            # Hand back a copy, so the cached frame is never modified.
+            if y != yvar:
+                return out, plotdf.assign(**{y: plotdf[yvar] * multiplier})
+            return out, plotdf.copy()
         else:
-            return g
+            return out
 
 
 
@@ -164,7 +430,7 @@ class cumulative_plotter:
                     ylim=None, palette=None,
                     timebin='5min', volume_unit='nanoliter',
                     height=10, width=10, return_plot_data=False,
-                    gridlines=True):
+                    gridlines=True, reuse_figure=False, verbose=False):
         """
         Produces a cumulative line plot depicting the average total volume
         consumed per fly for the entire assay. The plot will be tiled
@@ -177,7 +443,8 @@ class cumulative_plotter:
         col, row: string
             Accepts a categorical column in the espresso object. Each group in
             this column will be plotted on along the desired axis. If None,
-            the plots will be arranged in the other orthogonal dimension.
+            the plots will be arranged in the other orthogonal dimension. If
+            both are None, a single panel is plotted.
 
         color_by: string
             Accepts a categorical column in the espresso object. Each group in
@@ -217,9 +484,20 @@ class cumulative_plotter:
         gridlines boolean, default True
             Whether or not vertical gridlines are displayed at each hour.
 
+        reuse_figure: boolean, default False
+            If true, and the last plot drawn by `consumption` or `feed_count`
+            was also drawn with `reuse_figure`, is still open and has the
+            same facets, time window and size, it is cleared and redrawn
+            instead of creating a new figure. Only figures drawn with
+            `reuse_figure` are kept for reuse.
+
+        verbose: boolean, default False
+            If true, the progress of the munging and plotting is printed.
+
         Returns
         -------
-        seaborn FacetGrid object
+        seaborn FacetGrid object, or a matplotlib Figure if `row` and `col`
+        are both None.
         """
         from . import plot_helpers as plothelp
 
@@ -235,14 +513,16 @@ class cumulative_plotter:
                                         timebin=timebin,
                                         ylim=ylim, height=height, width=width,
                                         return_plot_data=return_plot_data,
-                                        gridlines=gridlines)
+                                        gridlines=gridlines,
+                                        reuse_figure=reuse_figure,
+                                        verbose=verbose)
 
 
     def feed_count(self, color_by, end_hour, row=None, col=None, start_hour=0,
                     ylim=None, palette=None,
                     timebin='5min', height=10, width=10,
                     return_plot_data=False,
-                    gridlines=True):
+                    gridlines=True, reuse_figure=False, verbose=False):
         """
         Produces a cumulative line plot depicting the average total feed count
         consumed per fly for the entire assay. The plot will be tiled
@@ -254,7 +534,8 @@ class cumulative_plotter:
         --------
         col, row: string
             Accepts a categorical column in the espresso object. Each group in
-            this column will be plotted on along the desired axis.
+            this column will be plotted on along the desired axis. If both
+            are None, a single panel is plotted.
 
         color_by: string
             Accepts a categorical column in the espresso object. Each group in
@@ -285,9 +566,20 @@ class cumulative_plotter:
         gridlines: boolean, default True
             Whether or not vertical gridlines are displayed at each hour.
 
+        reuse_figure: boolean, default False
+            If true, and the last plot drawn by `consumption` or `feed_count`
+            was also drawn with `reuse_figure`, is still open and has the
+            same facets, time window and size, it is cleared and redrawn
+            instead of creating a new figure. Only figures drawn with
+            `reuse_figure` are kept for reuse.
+
+        verbose: boolean, default False
+            If true, the progress of the munging and plotting is printed.
+
         Returns
         -------
-        seaborn FacetGrid object
+        seaborn FacetGrid object, or a matplotlib Figure if `row` and `col`
+        are both None.
         """
 
         return self.__cumulative_plotter(yvar='Cumulative Feed Count',
@@ -302,4 +594,6 @@ class cumulative_plotter:
                                         timebin=timebin,
                                         ylim=ylim, height=height, width=width,
                                         return_plot_data=return_plot_data,
-                                        gridlines=gridlines)
+                                        gridlines=gridlines,
+                                        reuse_figure=reuse_figure,
+                                        verbose=verbose)
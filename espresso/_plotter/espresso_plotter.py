@@ -7,9 +7,6 @@
 Plot functions for espresso objects.
 """
 
-# import sys as _sys
-# _sys.path.append("..") # so we can import munger from the directory above.
-
 
 class espresso_plotter():
     """
@@ -47,6 +44,11 @@ class espresso_plotter():
         # Create attribute so the other methods below can access the espresso object.
         self._experiment = espresso
 
+        # Raster palettes, keyed by the color_by column and the palette name,
+        # and the version of the feeds they were made for.
+        self.__palette_cache = {}
+        self.__palette_feeds_version = getattr(espresso, '_feeds_version', 0)
+
         # call obj.plot.xxx to access these methods.
         self.contrast = contrast.contrast_plotter(self)
         self.cumulative = cumulative.cumulative_plotter(self)
@@ -57,79 +59,109 @@ class espresso_plotter():
 
 
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Experiments saved by older versions have no raster palettes, and
+        # did not give the cumulative plotter a reference to the experiment.
+        self.__dict__.setdefault('_espresso_plotter__palette_cache', {})
+        self.__dict__.setdefault('_espresso_plotter__palette_feeds_version', 0)
+        if 'cumulative' in self.__dict__:
+            self.cumulative._link_experiment(self._experiment)
+
+
+
 
     def __plot_rasters(self, current_facet_feeds, current_facet_flies,
-                       maxflycount, color_by, palette,
-                       plot_ax, add_chamberid_labels):
+                       maxflycount, color_by, palette_categories,
+                       palette_rgba, plot_ax, add_chamberid_labels):
         """
         Helper function that actually plots the rasters.
-        """
-        from . import plot_helpers as plothelp
-        import pandas as pd
 
-        # Identify legitimate feeds; sort by time of first feed.
-        _feeding_flies = current_facet_feeds.sort_values(['RelativeTime_s','FeedDuration_s'])\
-                                            .ChamberID.drop_duplicates()\
-                                            .tolist()
-        # Index the current faceted feeds by ChamberID.
-        _current_facet_fly_index = current_facet_feeds.reset_index().set_index('ChamberID')
+        `palette_rgba` holds the RGBA color of each of `palette_categories`,
+        in the same order.
+        """
+        import numpy as np
+        from pandas import Categorical
+        from matplotlib.collections import PolyCollection
+        from matplotlib.transforms import blended_transform_factory
+
+        # Nothing to draw for a facet without feeds, unless it is labelled.
+        if len(current_facet_feeds) == 0 and not add_chamberid_labels:
+            return
+
+        # Identify legitimate feeds; sort by time of first feed. Only the
+        # first feed of each fly is sorted, rather than every feed.
+        _grouped_feeds = current_facet_feeds.groupby('ChamberID', sort=False,
+                                                     observed=True)
+        _first_feeds = _grouped_feeds.RelativeTime_s.min()
+        _order = np.argsort(_first_feeds.to_numpy(), kind='mergesort')
+        _feeding_flies = _first_feeds.index[_order].tolist()
 
         # Next, identify which flies did not feed (aka not in list above.)
         _non_feeding_flies = current_facet_flies[current_facet_flies.AtLeastOneFeed == False].ChamberID.tolist()
         _flies_in_order = _feeding_flies + _non_feeding_flies
 
-        for k, fly in enumerate(_flies_in_order):
-            rasterplot_kwargs = dict(alpha = 0.75, linewidth = 0,
-                                     ymin = (1/maxflycount) * (maxflycount-k-1),
-                                     ymax = (1/maxflycount) * (maxflycount-k))
-
-
-            if color_by is None:
-                rasterplot_kwargs['facecolor'] = 'grey'
-                rasterplot_kwargs['edgecolor'] = 'grey'
-
-
-            try:
-                _current_facet_fly = _current_facet_fly_index.loc[fly]
-                if isinstance(_current_facet_fly, pd.Series):
-                    rasterplot_kwargs['xmin'] = _current_facet_fly.RelativeTime_s
-                    rasterplot_kwargs['xmax'] = _current_facet_fly.RelativeTime_s + \
-                                                _current_facet_fly.FeedDuration_s
-                    if color_by is not None:
-                        color = palette[_current_facet_fly[color_by]]
-                        rasterplot_kwargs['facecolor'] = color
-                        rasterplot_kwargs['edgecolor'] = color
-                    plot_ax.axvspan(**rasterplot_kwargs)
-
-
-                elif isinstance(_current_facet_fly, pd.DataFrame):
-                    start = _current_facet_fly.RelativeTime_s.tolist()
-                    duration = _current_facet_fly.FeedDuration_s.tolist()
-
-                    for j, feed_start in enumerate(start):
-                        rasterplot_kwargs['xmin'] = feed_start
-                        rasterplot_kwargs['xmax'] = feed_start + duration[j]
-                        if color_by is not None:
-                            current_color_cat = _current_facet_fly[color_by].iloc[j]
-                            color = palette[current_color_cat]
-                            rasterplot_kwargs['facecolor'] = color
-                            rasterplot_kwargs['edgecolor'] = color
-                        plot_ax.axvspan(**rasterplot_kwargs)
-
-            except KeyError:
-                pass
-
-            if add_chamberid_labels:
-                if fly in _non_feeding_flies:
-                    label_color = 'grey'
-                else:
-                    label_color = 'black'
-                label = fly.split('_')[-1]
-                ypos = (1/maxflycount)*(maxflycount-k-1) + (1/maxflycount)*.5
-                plot_ax.text(-85, ypos, label, color=label_color,
-                             verticalalignment='center',
-                             horizontalalignment='right',
-                             fontsize=8)
+        # The top and bottom (in axes coordinates) of each fly's raster row.
+        _row_height = 1/maxflycount
+        _row_tops = (maxflycount - np.arange(len(_flies_in_order))) * _row_height
+        _row_bottoms = _row_tops - _row_height
+
+        # The raster row of each feed is the rank of its fly; the extent and
+        # color of every feed are found at once, and drawn as a single
+        # collection, rather than as one axvspan per feed.
+        _rank = np.empty(len(_order), dtype=np.int64)
+        _rank[_order] = np.arange(len(_order))
+        k = _rank[_grouped_feeds.ngroup().to_numpy()]
+        x0 = current_facet_feeds.RelativeTime_s.to_numpy()
+        x1 = x0 + current_facet_feeds.FeedDuration_s.to_numpy()
+        y0 = _row_bottoms[k]
+        y1 = _row_tops[k]
+
+        if color_by is None:
+            # One color for the whole collection.
+            colors = 'grey'
+        else:
+            # Look the colors up by category code, from an array of the
+            # palette's colors, rather than hashing each feed's category.
+            codes = Categorical(current_facet_feeds[color_by],
+                                categories=palette_categories).codes
+            # Feeds without a color are not drawn.
+            has_color = codes >= 0
+            colors = palette_rgba[codes[has_color]]
+            x0, x1, y0, y1 = x0[has_color], x1[has_color], \
+                             y0[has_color], y1[has_color]
+
+        if len(x0) > 0:
+            # Fill the corners of every rectangle into one array, rather
+            # than stacking intermediate copies.
+            verts = np.empty((len(x0), 4, 2))
+            verts[:, :2, 0] = x0[:, None]
+            verts[:, 2:, 0] = x1[:, None]
+            verts[:, [0, 3], 1] = y0[:, None]
+            verts[:, [1, 2], 1] = y1[:, None]
+            # Like axvspan, x is in data coordinates and y in axes
+            # coordinates. The x-axis limits are set by the caller.
+            rasters = PolyCollection(verts, facecolors=colors,
+                                     edgecolors=colors, linewidths=0,
+                                     alpha=0.75,
+                                     transform=blended_transform_factory(
+                                         plot_ax.transData, plot_ax.transAxes))
+            plot_ax.add_collection(rasters, autolim=False)
+
+        if add_chamberid_labels:
+            # The feeding flies come first, so whether a fly fed follows
+            # from its position, without searching the list of non-feeders.
+            n_feeding = len(_feeding_flies)
+            ypos = _row_bottoms + _row_height*.5
+            text_kwargs = dict(verticalalignment='center',
+                               horizontalalignment='right',
+                               fontsize=8)
+            # Only the part after the last underscore is shown.
+            labels = [fly.rsplit('_', 1)[-1] for fly in _flies_in_order]
+            for k, label in enumerate(labels):
+                label_color = 'black' if k < n_feeding else 'grey'
+                plot_ax.text(-85, ypos[k], label, color=label_color,
+                             **text_kwargs)
 
 
 
@@ -179,18 +211,18 @@ class espresso_plotter():
         -------
         matplotlib AxesSubplot(s)
         """
-        import numpy as np
         import matplotlib.pyplot as plt
         import matplotlib.patches as mpatches # for custom legends.
-        import pandas as pd
+        from matplotlib.colors import to_rgba_array
         import seaborn as sns
 
         from . import plot_helpers as plothelp
         from .._munger import munger as munge
 
-        # make a copy of the metadata and the feedlog.
-        allfeeds = self._experiment.feeds.copy()
-        allflies = self._experiment.flies.copy()
+        # The metadata and the feedlog are not modified here, so they are
+        # not copied.
+        allfeeds = self._experiment.feeds
+        allflies = self._experiment.flies
 
         # Check that col, row and color_by keywords are Attributes of the feeds.
         munge.check_group_by_color_by(col, row, color_by, allfeeds)
@@ -201,47 +233,49 @@ class espresso_plotter():
             err3 = "supply one of the single-category variables (eg. Sex)."
             raise ValueError(err1 + err2 + err3)
 
+        # The sorted groups of the relevant columns. These only set the
+        # panel counts and the palette order, so the columns themselves are
+        # left as they are, rather than being re-encoded as Categoricals.
+        cat_cols = [col, row, color_by]
+        levels = {column: munge.sorted_levels(allfeeds[column])
+                  for column in cat_cols if column is not None}
+
         if row is not None:
-            # print("Plotting rows by {0}".format(row))
-            row_count = int(len(allfeeds[row].cat.categories))
+            row_count = len(levels[row])
         else:
             row_count = 1
         if col is not None:
-            # print("Plotting columns by {0}".format(col))
-            col_count = int(len(allfeeds[col].cat.categories))
+            col_count = len(levels[col])
         else:
             col_count = 1
 
-        # Change relevant columns to categorical.
-        cat_cols = [col, row, color_by]
-        for column in [c for c in cat_cols if c is not None]:
-            try:
-                cats = np.sort(allfeeds[column].unique())
-                allfeeds.loc[:, column] = pd.Categorical(allfeeds[column],
-                                                       categories=cats,
-                                                       ordered=True)
-            except KeyError:
-                pass
-
-        # Reindex the feeds DataFrame for plotting.
+        # Split the valid feeds, and the flies, by facet once, rather than
+        # selecting each facet from the whole DataFrame.
         facets = [a for a in [col, row] if a is not None]
-        faceted_feeds = allfeeds.set_index(facets)
-        # Reindex the flies DataFrame for plotting.
         facets_metadata = [a for a in facets if a in allflies.columns]
-        faceted_flies = allflies.set_index(facets_metadata)
+
+        def facet_groups(df, by):
+            if len(by) == 0:
+                return {(): df}
+            grouped = df.groupby(by, sort=False, observed=True)
+            return {k if isinstance(k, tuple) else (k,): v for k, v in grouped}
+
+        feed_groups = facet_groups(allfeeds[allfeeds.Valid], facets)
+        fly_groups = facet_groups(allflies, facets_metadata)
+        no_feeds, no_flies = allfeeds.iloc[:0], allflies.iloc[:0]
+
+        def get_facet(**names):
+            feeds = feed_groups.get(tuple(names[f] for f in facets), no_feeds)
+            flies = fly_groups.get(tuple(names[f] for f in facets_metadata),
+                                   no_flies)
+            return feeds, flies
 
         # Get the number of flies for each group, then identify which is
         # the most numerous group. This is then used to scale the individual
-        # facets.
-        allflies_grpby = allflies.groupby(facets_metadata)
-        maxflycount = allflies_grpby.count().ChamberID.max()
-
-        # Get the total flycount.
-        try:
-            in_allflies = [a for a in facets if a in allflies.columns]
-            allflies_grpby = allflies.groupby(in_allflies)
-            maxflycount = allflies_grpby.count().ChamberID.max()
-        except KeyError:
+        # facets. The flies are already split by facet above.
+        if len(facets_metadata) > 0:
+            maxflycount = max(len(flies) for flies in fly_groups.values())
+        else:
             # group_by is not a column in the metadata,
             # so we assume that the number of flies in the raster plot
             # is simply the total number of flies.
@@ -261,53 +295,54 @@ class espresso_plotter():
 
         # Handle the palette.
         if color_by is not None:
-            color_groups = allfeeds[color_by].cat.categories
+            color_groups = levels[color_by]
             if palette is None:
                 palette = 'tab10'
-            color_pal = plothelp.create_palette(palette, color_groups)
+            # Reuse the palette made for the same column and named palette,
+            # as long as the feeds have not changed since.
+            feeds_version = getattr(self._experiment, '_feeds_version', 0)
+            if feeds_version != self.__palette_feeds_version:
+                self.__palette_cache.clear()
+                self.__palette_feeds_version = feeds_version
+            if isinstance(palette, str):
+                palette_key = (color_by, palette)
+            else: # a list or dict of colors; cheap to rebuild.
+                palette_key = None
+            color_pal = self.__palette_cache.get(palette_key)
+            if color_pal is None:
+                color_pal = plothelp.create_palette(palette, color_groups)
+                if palette_key is not None:
+                    self.__palette_cache[palette_key] = color_pal
 
             # Add custom legend and title.
             legend_kwargs = {'frameon': False,
                              'borderaxespad': 1,
                              'loc': 'upper left',
                              'edgecolor': 'white'}
-            raster_legend_handles = []
-            for key in color_pal.keys():
-                patch = mpatches.Patch(color=color_pal[key], label=key)
-                raster_legend_handles.append(patch)
+            raster_legend_handles = [mpatches.Patch(color=color, label=key)
+                                     for key, color in color_pal.items()]
+
+            # Convert the palette to RGBA once, for all the facets.
+            palette_categories = list(color_pal.keys())
+            palette_rgba = to_rgba_array(list(color_pal.values()))
 
         else:
-            color_pal = None
+            palette_categories, palette_rgba = None, None
 
 
         if row is not None and col is not None:
-            INDEX = faceted_feeds.index
-            ROWS = INDEX.get_level_values(row).unique()
-            COLUMNS = INDEX.get_level_values(col).unique()
+            ROWS = allfeeds[row].drop_duplicates().tolist()
+            COLUMNS = allfeeds[col].drop_duplicates().tolist()
             for r, row_ in enumerate(ROWS):
                 for c, col_ in enumerate(COLUMNS):
                     print("Plotting {} {}".format(row_, col_))
                     plot_ax = axx[r, c] # the axes to plot on.
                     # Select the data of interest to plot.
-                    try:
-                        current_facet_feeds = faceted_feeds.loc[col_].loc[row_]
-                        current_facet_flies = faceted_flies.loc[col_].loc[row_]
-                    except TypeError:
-                        # Sometimes there might be an error if one uses an
-                        # integer to index a Categorical index...
-                        # so index step-by-step instead.
-                        _temp_facet_feeds = faceted_feeds.loc[col_]
-                        FEED_INDEX = _temp_facet_feeds.index
-                        current_facet_feeds = _temp_facet_feeds[FEED_INDEX == row_]
-
-                        _temp_facet_flies = faceted_flies.loc[col_]
-                        FLIES_INDEX = _temp_facet_flies.index
-                        current_facet_flies = _temp_facet_flies[FLIES_INDEX == row_]
-
-                    # Get valid feeds.
-                    current_facet_feeds = current_facet_feeds[current_facet_feeds.Valid]
+                    current_facet_feeds, current_facet_flies = \
+                                        get_facet(**{col: col_, row: row_})
                     self.__plot_rasters(current_facet_feeds, current_facet_flies,
-                                        maxflycount, color_by, color_pal,
+                                        maxflycount, color_by,
+                                        palette_categories, palette_rgba,
                                         plot_ax, add_chamberid_labels)
                     plot_ax.set_title("{}; {}".format(col_, row_))
 
@@ -315,7 +350,7 @@ class espresso_plotter():
             # We only have one dimension here.
             plot_dim = [d for d in [row, col] if d is not None][0]
             # check how many panels in the single row/column.
-            panels = faceted_feeds.index.get_level_values(plot_dim).unique().tolist()
+            panels = allfeeds[plot_dim].drop_duplicates().tolist()
             more_than_one_panel = len(panels) > 1
 
             for j, dim_ in enumerate(panels):
@@ -325,11 +360,11 @@ class espresso_plotter():
                 else:
                     plot_ax = axx
                 print("Plotting {}".format(dim_))
-                current_facet_feeds = faceted_feeds[(faceted_feeds.index == dim_) &
-                                                    (faceted_feeds.Valid)]
-                current_facet_flies = faceted_flies[faceted_flies.index == dim_]
+                current_facet_feeds, current_facet_flies = \
+                                        get_facet(**{plot_dim: dim_})
                 self.__plot_rasters(current_facet_feeds, current_facet_flies,
-                                    maxflycount, color_by, color_pal,
+                                    maxflycount, color_by,
+                                    palette_categories, palette_rgba,
                                     plot_ax, add_chamberid_labels)
                 plot_ax.set_title(dim_)
 
@@ -340,22 +375,35 @@ class espresso_plotter():
         grid_kwargs = dict(alpha=0.75, which='major',
                            linestyle='solid', linewidth=1)
         despine_kwargs = dict(left=True, trim=False, offset=5)
+        min_x_seconds, max_x_seconds = start_hour*3600, end_hour*3600
+        # Every facet shares the same time window, so the ticks are computed
+        # once for all of them.
+        major_ticks = plothelp.timecourse_major_ticks(min_x_seconds,
+                                                      max_x_seconds)
         if row_count + col_count > 2:
             for a in axx.flatten():
                 # Plot vertical grid lines if desired.
                 if gridlines:
                     a.xaxis.grid(**grid_kwargs)
-                plothelp.format_timecourse_xaxis(a, min_x_seconds=start_hour*3600,
-                                                 max_x_seconds=end_hour*3600)
+                plothelp.format_timecourse_xaxis(a, min_x_seconds,
+                                                 max_x_seconds,
+                                                 major_ticks=major_ticks)
                 a.yaxis.set_visible(False)
-                sns.despine(ax=a, **despine_kwargs)
+            # Despine the whole figure at once, unless we were given the axes
+            # (and so might not own the rest of the figure).
+            if ax is None:
+                sns.despine(fig=fig, **despine_kwargs)
+            else:
+                for a in axx.flatten():
+                    sns.despine(ax=a, **despine_kwargs)
             rasterlegend_ax = axx.flatten()[-1]
 
         else:
             if gridlines:
                 axx.xaxis.grid(**grid_kwargs)
-            plothelp.format_timecourse_xaxis(axx, min_x_seconds=start_hour*3600,
-                                             max_x_seconds=end_hour*3600)
+            plothelp.format_timecourse_xaxis(axx, min_x_seconds,
+                                             max_x_seconds,
+                                             major_ticks=major_ticks)
             axx.yaxis.set_visible(False)
             sns.despine(ax=axx, **despine_kwargs)
             rasterlegend_ax = axx
@@ -420,16 +468,15 @@ class espresso_plotter():
 
         import matplotlib as mpl
         import matplotlib.pyplot as plt
-        # for custom legend?
-        from matplotlib.patches import Patch
+        # for custom legend.
         from matplotlib.lines import Line2D
 
         from .plot_helpers import compute_percent_feeding, create_palette
         import seaborn as sns
 
-        # make a copy of the metadata and the feedlog.
-        all_feeds = self._experiment.feeds.copy()
-        all_flies = self._experiment.flies.copy()
+        # The metadata and the feedlog are only read, so they are not copied.
+        all_feeds = self._experiment.feeds
+        all_flies = self._experiment.flies
         facets = [group_by, compare_by]
 
         for z in facets:
@@ -476,29 +523,35 @@ class espresso_plotter():
         legend_elements = []
 
         compareby_groups = percent_feeding_summary.index.levels[1].categories
-        if np.max([len(str(a)) for a in compareby_groups]) > 8:
+        if max(len(str(a)) for a in compareby_groups) > 8:
             rotate_ticks = True
         else:
             rotate_ticks = False
 
 
-        for j, group_by in enumerate(subplots):
+        # Split the summary by subplot in one pass, rather than indexing
+        # into the MultiIndex once per subplot.
+        plot_dfs = {subplot: df.droplevel(0) for subplot, df in
+                    percent_feeding_summary.groupby(level=0, observed=True)}
+
+        for j, subplot in enumerate(subplots):
             plot_ax = axx[j]
-            plot_color = palette[group_by]
+            plot_color = palette[subplot]
             legend_elements.append(Line2D([0], [0], color=plot_color,
-                                          lw=4, label=group_by)
+                                          lw=4, label=subplot)
                                   ),
 
 
-            plot_df = percent_feeding_summary.loc[group_by]
-            cilow = plot_df.ci_lower.tolist()
-            cihigh = plot_df.ci_upper.tolist()
-            ydata = plot_df.percent_feeding.tolist()
+            plot_df = plot_dfs[subplot]
+            cilow = plot_df.ci_lower.to_numpy()
+            cihigh = plot_df.ci_upper.to_numpy()
+            ydata = plot_df.percent_feeding.to_numpy()
+            xdata = np.arange(len(plot_df))
 
             plot_ax.set_ylim(0, 100)
             # Plot 95CI first.
             if len(plot_df) > 1:
-                plot_ax.fill_between(range(0,len(plot_df)), cilow, cihigh,
+                plot_ax.fill_between(xdata, cilow, cihigh,
                                      alpha=0.25, color=plot_color)
             else:
                 plot_ax.axvline(x=0, ymin=cilow[0]/100, ymax=cihigh[0]/100,
@@ -508,11 +561,12 @@ class espresso_plotter():
                                               color=plot_color,
                                               alpha=0.25)
 
-            for k, s in enumerate(ydata):
-                plot_ax.plot(k, s, 'o', clip_on=False, color=plot_color)
+            # Draw all the markers as one unconnected line.
+            plot_ax.plot(xdata, ydata, 'o', clip_on=False,
+                         color=plot_color)
 
             # Aesthetic tweaks.
-            plot_ax.xaxis.set_ticks([i for i in range(0,len(plot_df))])
+            plot_ax.xaxis.set_ticks(xdata)
             plot_ax.xaxis.set_ticklabels(plot_df.index.tolist())
 
             xmax = plot_ax.xaxis.get_ticklocs()[-1]
@@ -556,9 +610,8 @@ class espresso_plotter():
                 axes_to_rotate_xticks = [axx[-1]]
 
             for ax in axes_to_rotate_xticks:
-                for tick in ax.get_xticklabels():
-                    tick.set_rotation(45)
-                    tick.set_horizontalalignment('right')
+                plt.setp(ax.get_xticklabels(), rotation=45,
+                         horizontalalignment='right')
 
         title = 'Percent flies feeding\nt = {}hr to t = {}hr'.format(start_hour,
                                                                      end_hour)
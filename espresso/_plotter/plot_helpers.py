@@ -3,6 +3,8 @@
 # Author: Joses Ho
 # Email : joseshowh@gmail.com
 
+from functools import lru_cache
+
 
 def normalize_ylims(ax_arr, include_zero=False, draw_zero_line=False):
     """Custom function to normalize ylims for an array of axes."""
@@ -48,6 +50,57 @@ def meanci(mean, cilow, cihigh, idx, ax,
 
 
 
+def fill_between_collection(ax, x, lowers, uppers, colors=None, alpha=0.25):
+    """
+    Shades the area between each pair of `lowers` and `uppers` curves, as a
+    single PolyCollection on `ax`. The curves either all share the x-values
+    `x`, or `x` is a list with the x-values of each curve. This is
+    much cheaper to draw than one `fill_between` call per curve. Vertices
+    inside flat stretches of a curve are dropped, which keeps the saved
+    vector files small.
+
+    If `colors` is None, the colors of the default property cycle are used.
+
+    Returns the PolyCollection.
+    """
+    from itertools import cycle, repeat
+    import numpy as np
+    from matplotlib import rcParams
+    from matplotlib.collections import PolyCollection
+
+    def not_flat(y):
+        # The interior points of a flat run add vertices, but no shape.
+        keep = np.ones(len(y), dtype=bool)
+        keep[1:-1] = (y[1:-1] != y[:-2]) | (y[1:-1] != y[2:])
+        return keep
+
+    if isinstance(x, list):
+        xs = [np.asarray(a) for a in x]
+    else:
+        xs = repeat(np.asarray(x))
+    verts = []
+    for band_x, lower, upper in zip(xs, lowers, uppers):
+        lower, upper = np.asarray(lower), np.asarray(upper)
+        keep_lower, keep_upper = not_flat(lower), not_flat(upper)
+        verts.append(np.concatenate([
+                        np.column_stack([band_x[keep_lower], lower[keep_lower]]),
+                        np.column_stack([band_x[keep_upper][::-1],
+                                         upper[keep_upper][::-1]])
+                        ]))
+
+    if colors is None:
+        cycle_colors = rcParams['axes.prop_cycle'].by_key()['color']
+        colors = [c for c, _ in zip(cycle(cycle_colors), verts)]
+
+    bands = PolyCollection(verts, facecolors=colors, edgecolors='none',
+                           alpha=alpha)
+    ax.add_collection(bands)
+    ax.autoscale_view()
+
+    return bands
+
+
+
 # Define function for string formatting of scientific notation.
 def sci_nota(num, decimal_digits=2, precision=None, exponent=None):
     """
@@ -81,30 +134,25 @@ def compute_percent_feeding(all_feeds, all_flies, facets, start_hour, end_hour):
 
     if isinstance(facets, list):
         grpby = facets
-        feed_boolean_grpby = grpby.copy()
-        feed_boolean_grpby.append('ChamberID')
     else:
         raise TypeError('`facet` needs to be a list.')
     try:
         flies_group_by = [a for a in facets if a in all_flies.columns]
-        fly_counts = all_flies.groupby(flies_group_by).count().ChamberID
+        fly_counts = all_flies.groupby(flies_group_by).ChamberID.count()
     except ValueError: # flies_group_by is []
         fly_counts = len(all_flies)
 
     filter_feeds = ((all_feeds.RelativeTime_s > start_hour * 3600) &
                    (all_feeds.RelativeTime_s < end_hour * 3600) &
                    (all_feeds.Valid))
-    feeds_timewin = all_feeds[filter_feeds]
 
-    # To count total flies that fed, I adapted the methods here:
-    # https://stackoverflow.com/questions/8364674/python-numpy-how-to-count-the-number-of-true-elements-in-a-bool-array
-    feed_boolean_by_fly = ~np.isnan(feeds_timewin\
-                                    .groupby(feed_boolean_grpby)\
-                                    .sum()['FeedVol_µl'])
-
-    fly_feed_counts = feed_boolean_by_fly\
-                        .apply(np.count_nonzero)\
-                        .groupby(grpby).sum()
+    # The number of flies that fed in each group is the number of distinct
+    # chambers with a valid feed in the time window. This is counted in one
+    # groupby, only over the chamber column. The facets are categorical, so
+    # with observed=False the groups where no fly fed are kept, as 0.
+    fly_feed_counts = all_feeds.loc[filter_feeds, [*grpby, 'ChamberID']]\
+                               .groupby(grpby, observed=False)\
+                               .ChamberID.nunique()
 
     # Proportion code taken from here:
     # https://onlinecourses.science.psu.edu/stat100/node/56
@@ -144,25 +192,44 @@ def compute_percent_feeding(all_feeds, all_flies, facets, start_hour, end_hour):
 
 
 
+def timecourse_major_ticks(min_x_seconds, max_x_seconds,
+                           tick_interval_seconds=3600):
+    """
+    Returns the major tick positions, in seconds, for a timecourse x-axis.
+    """
+    import numpy as np
+
+    return np.arange(int(min_x_seconds),
+                     int(max_x_seconds + tick_interval_seconds/2),
+                     tick_interval_seconds)
+
+
+
 def format_timecourse_xaxis(ax, min_x_seconds, max_x_seconds,
                             tick_length=15, tick_pad=9,
-                            tick_interval_seconds=3600):
+                            tick_interval_seconds=3600, major_ticks=None):
     """
     Convenience function to format a timecourse plot's x-axis.
+
+    Pass `major_ticks` (as returned by `timecourse_major_ticks`) when
+    formatting many axes with the same limits, so the tick positions are
+    computed only once.
     """
     import matplotlib.ticker as tk
 
     ax.set_xlim(min_x_seconds, max_x_seconds)
 
-    ax.xaxis.set_ticks(range(int(min_x_seconds),
-                             int(max_x_seconds + tick_interval_seconds/2),
-                             tick_interval_seconds))
+    if major_ticks is None:
+        major_ticks = timecourse_major_ticks(min_x_seconds, max_x_seconds,
+                                             tick_interval_seconds)
+    ax.xaxis.set_ticks(major_ticks)
     ax.xaxis.set_minor_locator(tk.MultipleLocator(base=tick_interval_seconds/2))
 
     ax.set_xlabel('Time (h)')
-    newlabels = [str(int(t/tick_interval_seconds))
-                 for t in ax.xaxis.get_ticklocs(minor=False)]
-    ax.set_xticklabels(newlabels)
+    # Label the ticks in hours as they are drawn, rather than fixing a list
+    # of label strings on every axes.
+    ax.xaxis.set_major_formatter(tk.FuncFormatter(
+                        lambda t, pos: str(int(t/tick_interval_seconds))))
 
     ax.tick_params(length=tick_length, pad=tick_pad)
 
@@ -284,9 +351,9 @@ def check_time_window(start_hour, end_hour, expt_duration_hours):
 
 
 
+@lru_cache(maxsize=16)
 def get_unit_multiplier(unit, convert_from='nano'):
     """Convenience function to extract prefix from unit of volume."""
-    from numpy import ceil, floor
 
     exponent_dict = {'centi': -2,  'milli': -3, 'micro': -6, 'nano': -9,
                     'pico': -12}
@@ -305,6 +372,7 @@ def get_unit_multiplier(unit, convert_from='nano'):
 
 
 
+@lru_cache(maxsize=16)
 def get_new_prefix(unit):
 
     prefix_dict = {'centi': 'c',  'milli': 'm', 'micro': 'μ', 'nano': 'n',
@@ -346,10 +414,11 @@ def dabest_parser(plot_df, yvar):
     # # Make sure the ylims don't stretch below zero but still capture all
     # # the datapoints.
     # if 'swarm_ylim' not in plot_kwargs.keys():
-    #     ymin = np.min(plot_df[yvar])
+    #     yvals = plot_df[yvar].to_numpy()
+    #     ymin = yvals.min()
     #     if ymin == 0.:
     #         ymin = -5
-    #     plot_kwargs['swarm_ylim'] = (ymin, np.max(plot_df[yvar]) * 1.1)
+    #     plot_kwargs['swarm_ylim'] = (ymin, yvals.max() * 1.1)
     # 
     # 
     # 
@@ -23,7 +23,9 @@ class timecourse_plotter():
 
 
     def __init__(self, plotter): # pass along an espresso_plotter instance.
-        self.__feeds = plotter._experiment.feeds.copy()
+        # Keep a reference to the feeds; the munging functions never modify
+        # them in place, so there is no need for a defensive copy.
+        self.__feeds = plotter._experiment.feeds
         self.__flies = plotter._experiment.flies
         self.__expt_end_time = plotter._experiment.expt_duration_minutes
         # try:
@@ -47,7 +49,7 @@ class timecourse_plotter():
         from . import plot_helpers as plothelp
         from .._munger import munger as munge
 
-        feeds = self.__feeds.copy()
+        feeds = self.__feeds
         added_labels = self.__added_labels
 
         # Handle the group_by and color_by keywords.
@@ -162,11 +164,14 @@ class timecourse_plotter():
         if row_count + col_count > 1:
             plothelp.normalize_ylims(axx.flatten(),
                                      include_zero=True)
+            major_ticks = plothelp.timecourse_major_ticks(start_hour * 3600,
+                                                          end_hour * 3600)
             for plot_ax in axx.flatten():
                 # Format x-axis.
                 plothelp.format_timecourse_xaxis(plot_ax,
                                                    start_hour * 3600,
-                                                   end_hour * 3600)
+                                                   end_hour * 3600,
+                                                   major_ticks=major_ticks)
                 # Set label for y-axis.
                 plot_ax.set_ylabel(ylab)
                 # Plot vertical grid lines if desired.
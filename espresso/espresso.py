@@ -45,6 +45,9 @@ class espresso(object):
 
 
         self.version = '0.7.3'
+        # Bumped whenever `flies` and `feeds` are changed in place (eg. when
+        # labels are attached), so the plotters know to drop cached results.
+        self._feeds_version = 0
 
         allflies = []
         allfeeds = []
@@ -117,11 +120,10 @@ class espresso(object):
 
         food_choice_df = allflies[food_choice_cols]
         food_choice_df.set_index('ChamberID', inplace=True)
-        allfeeds['FoodChoice'] = allfeeds.apply(lambda x:
-                                    munge.assign_food_choice(x['ChamberID'],
-                                                             x['ChoiceIdx']+1,
-                                                             food_choice_df),
-                                    axis=1)
+        # Look up all the feeds at once, instead of row by row.
+        allfeeds['FoodChoice'] = munge.assign_food_choices(allfeeds['ChamberID'],
+                                                           allfeeds['ChoiceIdx']+1,
+                                                           food_choice_df)
 
         # Drop row if unable to assign feed choice to the row.
         allfeeds.dropna(axis=0, how='any', inplace=True)
@@ -420,6 +422,7 @@ class espresso(object):
                                                  categories=newcol.unique())
 
         labels=[label_name] # convert to single-member list.
+        self._feeds_version = getattr(self, '_feeds_version', 0) + 1
         if hasattr(self, 'added_labels'):
             self.added_labels.extend(labels)
         else:
@@ -458,6 +461,7 @@ class espresso(object):
 
         self.flies.drop(labels,axis = 1,inplace = True)
         self.feeds.drop(labels,axis = 1,inplace = True)
+        self._feeds_version = getattr(self, '_feeds_version', 0) + 1
 
         # check if we need to remove the added_labels attribute.
         if labels == self.added_labels:
@@ -482,6 +486,7 @@ class espresso(object):
 
         for attr in [self.flies, self.feeds]:
             attr.drop(dropped,axis = 1,inplace = True)
+        self._feeds_version = getattr(self, '_feeds_version', 0) + 1
 
         del self.__dict__['added_labels']
 
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*-coding: utf-8 -*-
+
+"""
+Tests for the cumulative plots.
+"""
+
+import numpy as np
+
+import matplotlib as mpl
+mpl.use('Agg')
+import matplotlib.pyplot as plt
+
+import pytest
+
+from .utils import create_dummy_experiment
+
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    return create_dummy_experiment(str(tmp_path))
+
+
+
+def legend_labels(fig):
+    return [[t.get_text() for t in legend.get_texts()]
+            for legend in fig.legends]
+
+
+
+def test_reuse_figure(experiment):
+    cumulative = experiment.plot.cumulative
+    kwargs = dict(color_by='Genotype', end_hour=6, col='Temperature',
+                  reuse_figure=True)
+
+    g = cumulative.consumption(**kwargs)
+    fig = g.fig
+    size = tuple(fig.get_size_inches())
+    labels = legend_labels(fig)
+    genotypes = experiment.feeds.Genotype.cat.categories.tolist()
+    assert labels == [genotypes]
+
+    for palette in ['Set1', 'tab10']:
+        g = cumulative.consumption(palette=palette, **kwargs)
+        assert g.fig is fig
+        assert tuple(fig.get_size_inches()) == size
+        assert legend_labels(fig) == labels
+
+    # The legend follows the colors of the lines drawn last.
+    line_colors = {line.get_label(): line.get_color()
+                   for ax in g.axes.flat for line in ax.get_lines()}
+    legend_colors = {text.get_text(): line.get_color()
+                     for text, line in zip(fig.legends[0].get_texts(),
+                                           fig.legends[0].get_lines())}
+    assert legend_colors == line_colors
+
+    plt.close('all')
+
+
+
+def test_plot_data_precision(experiment):
+    _, plot_data = experiment.plot.cumulative.consumption(
+                                        color_by='Genotype', end_hour=6,
+                                        return_plot_data=True)
+    plt.close('all')
+
+    assert plot_data['Cumulative Volume (µl)'].dtype == 'float64'
+    assert plot_data['Cumulative Volume (nl)'].dtype == 'float64'
+    assert plot_data['Cumulative Feed Count'].dtype == 'float64'
+    assert plot_data['time_s'].dtype == 'int64'
+
+    # The sums are not rounded: the last cumulative volume of each chamber
+    # is the total volume of its feeds, to double precision.
+    feeds = experiment.feeds[experiment.feeds.Valid]
+    totals = feeds.groupby('ChamberID', observed=True)\
+                  ['AverageFeedVolumePerFly_µl'].sum()
+    last = plot_data.sort_values('time_s')\
+                    .groupby('ChamberID', observed=True)\
+                    ['Cumulative Volume (µl)'].last()
+    assert np.allclose(last[totals.index], totals, rtol=1e-12, atol=0)
+
+
+
+def test_figure_kept_only_for_reuse(experiment):
+    cumulative = experiment.plot.cumulative
+    kwargs = dict(color_by='Genotype', end_hour=6, col='Temperature')
+
+    cumulative.consumption(**kwargs)
+    assert cumulative._cumulative_plotter__last_figure is None
+
+    g = cumulative.consumption(reuse_figure=True, **kwargs)
+    assert cumulative._cumulative_plotter__last_figure[2] is g.fig
+
+    cumulative.consumption(**kwargs)
+    assert cumulative._cumulative_plotter__last_figure is None
+    plt.close('all')
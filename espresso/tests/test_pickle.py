@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*-coding: utf-8 -*-
+
+"""
+Tests for saving and loading espresso experiments.
+"""
+
+import matplotlib as mpl
+mpl.use('Agg')
+import matplotlib.pyplot as plt
+
+import pytest
+
+from .utils import create_dummy_experiment
+from ..espresso import load
+
+
+
+# Attributes added to the plotters after the first saved experiments.
+CUMULATIVE_ATTRIBUTES = ['checked_facets', 'cumsum_cache', 'stats_cache',
+                         'time_order', 'last_figure', 'experiment',
+                         'cached_feeds_version']
+PLOTTER_ATTRIBUTES = ['palette_cache', 'palette_feeds_version']
+
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    return create_dummy_experiment(str(tmp_path))
+
+
+
+def save_without(experiment, path, cumulative_attributes=(),
+                 plotter_attributes=()):
+    """
+    Saves `experiment` as an older version would have, without the given
+    attributes of its plotters, and loads it back.
+    """
+    state = experiment.plot.cumulative.__dict__
+    for name in cumulative_attributes:
+        del state['_cumulative_plotter__' + name]
+    state = experiment.plot.__dict__
+    for name in plotter_attributes:
+        del state['_espresso_plotter__' + name]
+    experiment.save(path)
+    return load(path)
+
+
+
+def test_load_without_cumulative_caches(experiment, tmp_path):
+    loaded = save_without(experiment, str(tmp_path / 'old.pkl'),
+                          CUMULATIVE_ATTRIBUTES)
+
+    g = loaded.plot.cumulative.consumption(color_by='Genotype', end_hour=6,
+                                           col='Temperature')
+    assert len(g.axes.flat) == 2
+    plt.close('all')
+
+    # The loaded plotter still notices changes to the feeds.
+    loaded._feeds_version += 1
+    loaded.plot.cumulative.feed_count(color_by='Genotype', end_hour=6)
+    plt.close('all')
+
+
+
+def test_load_without_raster_palettes(experiment, tmp_path):
+    loaded = save_without(experiment, str(tmp_path / 'old.pkl'),
+                          plotter_attributes=PLOTTER_ATTRIBUTES)
+
+    loaded.plot.rasters(start_hour=0, end_hour=6, row='Temperature',
+                        color_by='Genotype')
+    plt.close('all')
+
+
+
+def test_save_and_load(experiment, tmp_path):
+    experiment.plot.cumulative.consumption(color_by='Genotype', end_hour=6)
+    plt.close('all')
+
+    path = str(tmp_path / 'new.pkl')
+    experiment.save(path)
+    loaded = load(path)
+
+    # The cached sums are not saved, but are kept by the saved experiment.
+    assert loaded.plot.cumulative._cumulative_plotter__cumsum_cache == {}
+    assert loaded.plot.cumulative._cumulative_plotter__stats_cache == {}
+    assert experiment.plot.cumulative._cumulative_plotter__cumsum_cache
+
+    loaded.plot.cumulative.consumption(color_by='Genotype', end_hour=6)
+    plt.close('all')
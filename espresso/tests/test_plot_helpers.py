@@ -0,0 +1,36 @@
+#!/usr/bin/python
+# -*-coding: utf-8 -*-
+
+"""
+Tests for the plot helpers.
+"""
+
+import pytest
+
+from .utils import create_dummy_experiment
+from .._plotter.plot_helpers import compute_percent_feeding
+
+
+
+@pytest.fixture
+def experiment(tmp_path):
+    return create_dummy_experiment(str(tmp_path))
+
+
+
+def test_compute_percent_feeding(experiment):
+    summary = compute_percent_feeding(experiment.feeds, experiment.flies,
+                                      ['Genotype', 'Temperature'],
+                                      start_hour=0, end_hour=6)
+    percent = summary.percent_feeding
+
+    # Every w1118 fly fed; one of the three MyGal4>UAS flies did not.
+    assert percent[('w1118', 22)] == pytest.approx(100)
+    assert percent[('MyGal4>UAS', 29)] == pytest.approx(200 / 3)
+    assert (percent.dropna() <= 100).all()
+
+    # No fly fed in a window without feeds.
+    summary = compute_percent_feeding(experiment.feeds, experiment.flies,
+                                      ['Genotype', 'Temperature'],
+                                      start_hour=7, end_hour=8)
+    assert summary.percent_feeding[('w1118', 22)] == 0
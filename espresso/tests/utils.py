@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# -*-coding: utf-8 -*-
+
+"""
+Helpers for the espresso tests.
+"""
+
+
+
+def create_dummy_experiment(folder, expt_duration_minutes=360):
+    """
+    Writes a small FeedLog and MetaData pair into `folder`, and returns the
+    espresso experiment loaded from it. The last chamber never feeds.
+    """
+    import os
+
+    import numpy as np
+    import pandas as pd
+
+    from ..espresso import espresso
+
+    rng = np.random.RandomState(12345)
+    chamber_count = 6
+
+    metadata = pd.DataFrame({'ID': range(1, chamber_count + 1),
+                             'Genotype': ['w1118'] * 3 + ['MyGal4>UAS'] * 3,
+                             'Sex': ['M', 'F'] * 3,
+                             'Temperature': [22] * 3 + [29] * 3,
+                             'Food 1': ['5%S'] * chamber_count,
+                             'Food 2': ['5%YE'] * chamber_count,
+                             '#Flies': [1] * chamber_count,
+                             'Minimum Age': [3] * chamber_count,
+                             'Maximum Age': [5] * chamber_count})
+
+    feeds = []
+    for chamber in range(chamber_count - 1):
+        for t in np.sort(rng.uniform(0, expt_duration_minutes * 60, 8)):
+            feeds.append({'FlyID': chamber,
+                          'ChoiceIdx': rng.randint(0, 2),
+                          'AviFile': 'dummy.avi',
+                          'Volume-mm3': rng.uniform(1e-4, 1e-3),
+                          'Duration-ms': rng.uniform(500, 5000),
+                          'RelativeTime-s': t,
+                          'StartTime': 0, 'StartFrame': 0,
+                          'FeedTubeIdx': 0, 'Valid': True,
+                          'Evap-mm3/s': 0,
+                          'ExperimentState': 'Running'})
+    feedlog = pd.DataFrame(feeds)
+
+    stamp = '2019-01-01_10-00-00'
+    feedlog.to_csv(os.path.join(folder, 'FeedLog_{}.csv'.format(stamp)),
+                   index=False)
+    metadata.to_csv(os.path.join(folder, 'MetaData_{}.csv'.format(stamp)),
+                    index=False)
+
+    return espresso(folder, expt_duration_minutes)